@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Benchmarks for Flask-Notifications."""
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Run the benchmarks and write their results as JSON.
+
+Every benchmark runs offline. Keep the results of each release to compare
+them with the next one.
+
+Usage:
+  $ python -m benchmarks [--output results.json] [benchmark ...]
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import sys
+import time
+from importlib import import_module
+
+from flask_notifications.version import __version__
+
+#: Modules of the benchmarks, each with a ``run`` function
+BENCHMARKS = ("pipeline", "filters", "event_memory", "email_smtp",
+              "sse_async_load")
+
+
+def run(names=BENCHMARKS):
+    """Run the benchmarks and return their results with the environment."""
+    results = {}
+    for name in names:
+        if name == "sse_async_load" and sys.version_info < (3, 6):
+            continue
+        results[name] = import_module("benchmarks." + name).run()
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    """Parse the command line and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help="benchmarks to run, all by default: "
+                             "{0}".format(", ".join(BENCHMARKS)))
+    parser.add_argument("--output", "-o",
+                        help="file of the results, standard output by "
+                             "default")
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark {0}".format(name))
+
+    report = json.dumps(run(args.benchmarks or BENCHMARKS), indent=2,
+                        sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
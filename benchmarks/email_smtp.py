@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Compare sending emails with a connection per message or a shared one.
+
+The mail server is a local stand-in which accepts and drops every message,
+so only the cost of the SMTP sessions is measured.
+
+Usage:
+  $ python -m benchmarks.email_smtp
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+
+from flask import Flask
+from six.moves import socketserver
+
+from flask_notifications.consumers.email.flaskmail_consumer import \
+    FlaskMailConsumer
+from flask_notifications.event import Event
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP session accepting every message."""
+
+    def reply(self, line):
+        """Send a reply line to the client."""
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        """Answer the commands of a session until QUIT."""
+        self.reply(b"220 localhost SMTP sink")
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.server.count()
+                    self.reply(b"250 OK")
+                continue
+
+            command = line[:4].upper()
+            if command == b"DATA":
+                in_data = True
+                self.reply(b"354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply(b"221 Bye")
+                return
+            elif command == b"EHLO":
+                self.reply(b"250 localhost")
+            else:
+                self.reply(b"250 OK")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Local SMTP server counting the messages it receives."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        """Listen on a free port of the loopback interface."""
+        socketserver.ThreadingTCPServer.__init__(
+            self, ("127.0.0.1", 0), SmtpSinkHandler
+        )
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        """Count a received message."""
+        with self._lock:
+            self.messages += 1
+
+
+def run(messages=2000, max_messages=100):
+    """Send the messages both ways and return their throughput."""
+    sink = SmtpSink()
+    thread = threading.Thread(target=sink.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER="127.0.0.1",
+                      MAIL_PORT=sink.server_address[1],
+                      MAIL_SUPPRESS_SEND=False)
+    consumer = FlaskMailConsumer.from_app(
+        app, "sender@localhost", ["recipient@localhost"],
+        max_messages=max_messages
+    )
+    event_json = Event("1234", "user", "Title", "Body").to_json()
+
+    results = {"messages": messages, "max_messages": max_messages}
+    try:
+        with app.app_context():
+            start = time.time()
+            for _ in range(messages):
+                consumer.mail.send(consumer.create_message(event_json))
+            results["connection_per_message"] = \
+                messages / (time.time() - start)
+
+            start = time.time()
+            consumer.consume_many([event_json] * messages)
+            consumer.close()
+            results["shared_connection"] = messages / (time.time() - start)
+    finally:
+        sink.shutdown()
+        sink.server_close()
+
+    assert sink.messages == 2 * messages
+    results["speedup"] = \
+        results["shared_connection"] / results["connection_per_message"]
+    return results
+
+
+if __name__ == "__main__":
+    print("{messages} emails: {connection_per_message:.0f} messages/s with a "
+          "connection per message, {shared_connection:.0f} messages/s "
+          "sharing a connection for {max_messages} messages "
+          "({speedup:.1f}x)".format(**run()))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Compare the memory used by :class Event: and :class CompactEvent:.
+
+Usage:
+  $ python -m benchmarks.event_memory
+"""
+
+from __future__ import print_function
+
+import gc
+import tracemalloc
+
+from flask_notifications.compact_event import CompactEvent
+from flask_notifications.event import Event
+
+
+def measure(event_class, count):
+    """Return the bytes allocated per event when keeping ``count`` events.
+
+    The values of the fields are shared by all the events, so only the
+    events themselves are measured.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events = [event_class("1234", "user", "Title", "Body",
+                          timestamp=1.0, sender="system")
+              for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+    return float(after - before) / count
+
+
+def run(count=100000):
+    """Measure the bytes per event of both event types."""
+    results = {
+        "event_bytes": measure(Event, count),
+        "compact_event_bytes": measure(CompactEvent, count),
+    }
+    results["ratio"] = results["event_bytes"] / results["compact_event_bytes"]
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    print("Event: {0[event_bytes]:.0f} bytes, CompactEvent: "
+          "{0[compact_event_bytes]:.0f} bytes ({0[ratio]:.1f}x)"
+          .format(results))
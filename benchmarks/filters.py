@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Compare the evaluation of filter trees with their compiled predicates.
+
+Usage:
+  $ python -m benchmarks.filters
+"""
+
+from __future__ import print_function
+
+import time
+import timeit
+from datetime import datetime, timedelta
+
+from flask_notifications.filters import AfterDate, BeforeDate, Expired, \
+    Not, WithEventType, WithId, WithRecipients, WithSender
+
+
+def build_filter(depth):
+    """Build a left-deep filter tree with ``depth`` leaves."""
+    tomorrow = datetime.now() + timedelta(days=1)
+    leaves = [
+        lambda i: WithEventType("user"),
+        lambda i: Not(WithSender("sender-{0}".format(i))),
+        lambda i: Not(Expired()),
+        lambda i: BeforeDate(tomorrow),
+        lambda i: Not(WithId("id-{0}".format(i))),
+        lambda i: Not(AfterDate(tomorrow)),
+        lambda i: WithRecipients(["jvican"]) | WithSender("system"),
+    ]
+    event_filter = leaves[0](0)
+    for i in range(1, depth):
+        event_filter = event_filter & leaves[i % len(leaves)](i)
+    return event_filter
+
+
+def build_event():
+    """Build an event matching the filters of :func build_filter:."""
+    return {"event_id": "1234",
+            "event_type": "user",
+            "title": "Benchmark",
+            "body": "Benchmark",
+            "timestamp": time.time(),
+            "sender": "system",
+            "recipients": ["jvican"],
+            "tags": [],
+            "expiration_datetime": datetime.now() + timedelta(days=1)}
+
+
+def run(depths=(5, 10, 20), number=20000):
+    """Time both strategies for every depth, in microseconds per event."""
+    event = build_event()
+    results = {}
+    for depth in depths:
+        tree = build_filter(depth)
+        compiled = tree.compile()
+        assert tree(event) == compiled(event)
+
+        tree_time = min(timeit.repeat(lambda: tree(event),
+                                      number=number, repeat=3))
+        compiled_time = min(timeit.repeat(lambda: compiled(event),
+                                          number=number, repeat=3))
+        results["depth_{0}".format(depth)] = {
+            "tree_us": tree_time / number * 1e6,
+            "compiled_us": compiled_time / number * 1e6,
+            "speedup": tree_time / compiled_time,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in sorted(run().items()):
+        print("{0}: tree {1[tree_us]:.2f}us, compiled {1[compiled_us]:.2f}us "
+              "({1[speedup]:.1f}x)".format(name, result))
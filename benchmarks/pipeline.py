@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Throughput of the stages of the notification pipeline, offline.
+
+Celery runs the tasks eagerly and the broker is a :class LocalBroker:, so
+neither Redis nor a worker is needed.
+
+Usage:
+  $ python -m benchmarks.pipeline
+"""
+
+from __future__ import print_function
+
+import json
+import time
+import timeit
+
+from celery import Celery
+from flask import Flask
+
+from flask_notifications import Notifications
+from flask_notifications.backend.local_backend import LocalBackend, \
+    LocalBroker
+from flask_notifications.compact_event import CompactEvent
+from flask_notifications.consumers.push.ssenotifier import SseNotifier
+from flask_notifications.event import Event
+
+
+def create_app():
+    """Create an application with eager Celery and a local broker."""
+    app = Flask(__name__)
+    app.config.update(
+        BACKEND="flask_notifications.backend.local_backend.LocalBackend",
+        CELERY_ALWAYS_EAGER=True,
+    )
+    celery = Celery()
+    celery.conf.update(task_always_eager=True)
+    notifications = Notifications(app=app, celery=celery,
+                                  broker=LocalBroker())
+    return app, notifications
+
+
+def per_second(fn, number):
+    """Get the calls per second of a function, the best of three."""
+    return number / min(timeit.repeat(fn, number=number, repeat=3))
+
+
+def events(number=20000):
+    """Measure the construction and serialization of the events."""
+    fields = ("1234", "user", "Title", "Body")
+    event = Event(*fields, sender="system", recipients=["jvican"])
+    event_json = event.to_json()
+    return {
+        "construct_per_second": per_second(lambda: Event(*fields), number),
+        "construct_compact_per_second":
+            per_second(lambda: CompactEvent(*fields), number),
+        "validate_full_per_second":
+            per_second(lambda: event.validate("full"), number),
+        "validate_fast_per_second":
+            per_second(lambda: event.validate("fast"), number),
+        "to_json_per_second": per_second(event.to_json, number),
+        "from_json_per_second":
+            per_second(lambda: Event.from_json(event_json), number),
+        "from_json_trusted_per_second":
+            per_second(lambda: Event.from_json(event_json, trusted=True),
+                       number),
+    }
+
+
+def fan_out(hubs, consumers, number=1000):
+    """Measure sending events to ``hubs`` hubs of ``consumers`` consumers.
+
+    The signals of the hubs are global, so every configuration has its own
+    hubs, whose consumers are deregistered at the end.
+    """
+    app, notifications = create_app()
+    deliveries = []
+    registered = []
+
+    def create_consumer():
+        def consumer(event_json):
+            deliveries.append(event_json)
+        return consumer
+
+    for i in range(hubs):
+        alias = "Benchmark{0}x{1}-{2}".format(hubs, consumers, i)
+        hub = notifications.create_hub(alias)
+        for j in range(consumers):
+            consumer = create_consumer()
+            hub.register_consumer(
+                consumer,
+                name="benchmarks.pipeline.{0}.consumer{1}".format(alias, j)
+            )
+            registered.append((hub, consumer))
+
+    batch = [Event(None, "user", "Title", "Body") for _ in range(number)]
+    with app.app_context():
+        start = time.time()
+        for event in batch:
+            notifications.send(event)
+        send_seconds = time.time() - start
+
+        start = time.time()
+        notifications.send_many(batch)
+        send_many_seconds = time.time() - start
+
+    for hub, consumer in registered:
+        hub.deregister_consumer(consumer)
+
+    assert len(deliveries) == 2 * number * hubs * consumers
+    return {
+        "send_events_per_second": number / send_seconds,
+        "send_deliveries_per_second":
+            number * hubs * consumers / send_seconds,
+        "send_many_events_per_second": number / send_many_seconds,
+    }
+
+
+def sse_frames(clients=100, number=2000):
+    """Measure the frames queued per second by a notifier for its clients."""
+    notifier = SseNotifier(LocalBackend(LocalBroker()), "benchmark",
+                           queue_size=number)
+    sse_clients = [notifier.client() for _ in range(clients)]
+    for client in sse_clients:
+        notifier.add_client(client)
+
+    data = Event("1234", "user", "Title", "Body").to_json()
+    start = time.time()
+    for _ in range(number):
+        notifier.publish(data)
+    seconds = time.time() - start
+
+    assert all(len(client.queue) == number for client in sse_clients)
+    return {
+        "clients": clients,
+        "messages_per_second": number / seconds,
+        "frames_per_second": number * clients / seconds,
+    }
+
+
+def run(fan_outs=((1, 1), (1, 10), (10, 1), (10, 10))):
+    """Measure every stage and return their throughput."""
+    app, _ = create_app()
+    with app.app_context():
+        results = {"events": events(), "sse": sse_frames()}
+    for hubs, consumers in fan_outs:
+        results["fan_out_{0}x{1}".format(hubs, consumers)] = \
+            fan_out(hubs, consumers)
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2, sort_keys=True))
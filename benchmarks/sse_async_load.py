@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Load test of :class AsyncSseNotifier: with many open streams.
+
+The broker is an in-process stand-in, so only the notifier is measured.
+It requires Python 3.6 or later.
+
+Usage:
+  $ python -m benchmarks.sse_async_load
+"""
+
+import asyncio
+import time
+import tracemalloc
+from collections import defaultdict
+
+from flask_notifications.backend.async_backend import AsyncBackend
+from flask_notifications.consumers.push.async_ssenotifier import \
+    AsyncSseNotifier
+
+
+class InProcessBroker(object):
+    """Broker stand-in delivering the messages inside the event loop."""
+
+    def __init__(self):
+        """Initialise the channels without subscribers."""
+        self.channels = defaultdict(set)
+
+
+class InProcessBackend(AsyncBackend):
+    """Backend over an :class InProcessBroker:."""
+
+    def __init__(self, broker):
+        """Initialise the queue of the subscriber."""
+        super(InProcessBackend, self).__init__(broker)
+        self.queue = asyncio.Queue()
+
+    async def publish(self, channel, event):
+        """Publish an event to the subscribers of a channel."""
+        subscribers = self.broker.channels[channel]
+        for queue in subscribers:
+            queue.put_nowait({"type": "message", "channel": channel,
+                              "data": event})
+        return len(subscribers)
+
+    async def subscribe(self, channel):
+        """Subscribe to a channel."""
+        self.broker.channels[channel].add(self.queue)
+        self.queue.put_nowait({"type": "subscribe", "channel": channel,
+                               "data": 1})
+
+    async def listen(self):
+        """Yield the messages of the subscribed channels."""
+        while True:
+            yield await self.queue.get()
+
+
+async def load(clients, messages, event_json):
+    """Open the streams, publish the messages and wait for all of them."""
+    broker = InProcessBroker()
+    notifier = AsyncSseNotifier(InProcessBackend(broker), "hub",
+                                queue_size=messages)
+    publisher = InProcessBackend(broker)
+
+    async def stream():
+        frames = notifier.client()
+        await frames.__anext__()
+        if len(notifier.clients) == clients:
+            opened.set_result(None)
+        for _ in range(messages):
+            await frames.__anext__()
+        await frames.aclose()
+
+    opened = asyncio.get_event_loop().create_future()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    streams = [asyncio.ensure_future(stream()) for _ in range(clients)]
+    await opened
+    # Let the listener subscribe
+    while not broker.channels["hub"]:
+        await asyncio.sleep(0)
+    connected = tracemalloc.get_traced_memory()[0]
+
+    start = time.time()
+    for _ in range(messages):
+        await publisher.publish("hub", event_json)
+    await asyncio.gather(*streams)
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    notifier.close()
+    await asyncio.sleep(0)
+
+    return {
+        "clients": clients,
+        "messages": messages,
+        "seconds": elapsed,
+        "frames_per_second": clients * messages / elapsed,
+        "bytes_per_connection": float(connected - before) / clients,
+        "peak_bytes_per_connection": float(peak - before) / clients,
+    }
+
+
+def run(clients=10000, messages=10):
+    """Run the load test in a new event loop."""
+    event_json = '{"event_id": "1234", "title": "Load test"}'
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(load(clients, messages, event_json))
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    results = run()
+    print("{clients} clients x {messages} messages in {seconds:.2f}s "
+          "({frames_per_second:.0f} frames/s), {bytes_per_connection:.0f} "
+          "bytes per connection, {peak_bytes_per_connection:.0f} at peak"
+          .format(**results))
@@ -9,17 +9,42 @@
 
 """Real-time Notification framework as a Flask extension."""
 
+import time
 from importlib import import_module
+from itertools import islice
 
-from flask import current_app, Response
+from flask import current_app, request, Response
 from flask_celeryext import FlaskCeleryExt
 from werkzeug.local import LocalProxy
 
+from flask_notifications.backend.redis_streams_backend import \
+    RedisStreamsBackend
 from flask_notifications.consumers.push.ssenotifier import SseNotifier
+from flask_notifications.deduplication import Deduplicator
+from flask_notifications.drop_counters import DropCounters
+from flask_notifications.event import EventMixin
 from flask_notifications.event_hub import EventHub
+from flask_notifications.hub_index import HubIndex
+from flask_notifications.priorities import PriorityLanes
+from flask_notifications.rate_limits import LocalTokenBuckets, RateLimit, \
+    RedisTokenBuckets
 from .version import __version__
 
 
+# The codec of the events is set for the whole process by the first
+# application initialised, see NOTIFICATIONS_CODEC
+_events_codec = {}
+
+
+def import_class(path):
+    """Import a class from its Python path."""
+    path = path.split(".")
+    module, classname = path[0:-1], path[-1]
+
+    imported_module = import_module(".".join(module))
+    return getattr(imported_module, classname)
+
+
 class Notifications(object):
     """Flask extension implementing a Notification service."""
 
@@ -36,7 +61,10 @@ class Notifications(object):
         self.celery = celery
         self.broker = broker
         self._hubs = {}
+        self._hub_index = HubIndex()
         self._notifiers = {}
+        # Events expired when sent or before being consumed, per stage
+        self.dropped = DropCounters()
 
         if app is not None:
             self.init_app(app, celery, broker, *args, **kwargs)
@@ -65,11 +93,74 @@ class Notifications(object):
         default_backend = \
             "flask_notifications.backend.redis_backend.RedisBackend"
         backend_option = self.app.config["BACKEND"] or default_backend
-        backend_option = backend_option.split(".")
-        module, classname = backend_option[0:-1], backend_option[-1]
+        self.backend = import_class(backend_option)
+
+        app.config.setdefault("NOTIFICATIONS_SEND_MANY_CHUNK_SIZE", 500)
+        app.config.setdefault("NOTIFICATIONS_EXECUTOR_MAX_WORKERS", 4)
+        app.config.setdefault("NOTIFICATIONS_EXECUTOR_MAX_PENDING", 1000)
+        app.config.setdefault("NOTIFICATIONS_HUB_DISPATCH", "consumer")
+        app.config.setdefault("NOTIFICATIONS_PRIORITIES", {})
+        app.config.setdefault("NOTIFICATIONS_PRIORITY_QUEUES", {})
+        app.config.setdefault("NOTIFICATIONS_PRIORITY_LEVELS", {})
+        app.config.setdefault("NOTIFICATIONS_PRIORITY_WEIGHTS", None)
+        app.config.setdefault("NOTIFICATIONS_RATE_LIMIT_STORE", "local")
+        app.config.setdefault("NOTIFICATIONS_DEDUPLICATION_WINDOW", None)
+        app.config.setdefault("NOTIFICATIONS_DEDUPLICATION_SIZE", 10000)
+        app.config.setdefault("NOTIFICATIONS_DEDUPLICATION_STORE", "local")
+        app.config.setdefault("NOTIFICATIONS_CODEC", None)
+        app.config.setdefault("NOTIFICATIONS_STREAMS_GROUP",
+                              "flask-notifications")
+        app.config.setdefault("NOTIFICATIONS_STREAMS_CONSUMER", None)
+        app.config.setdefault("NOTIFICATIONS_STREAMS_CLAIM_IDLE", 60000)
+        app.config.setdefault("NOTIFICATIONS_SSE_QUEUE_SIZE", 100)
+        app.config.setdefault("NOTIFICATIONS_SSE_SLOW_CLIENT_POLICY",
+                              "drop-oldest")
+        app.config.setdefault("NOTIFICATIONS_SSE_HEARTBEAT", 15)
+        app.config.setdefault("NOTIFICATIONS_SSE_REPLAY_EVENTS", 100)
+        app.config.setdefault("NOTIFICATIONS_SSE_REPLAY_BYTES", 1024 * 1024)
+
+        # Priority lanes shared by the hubs
+        self.lanes = PriorityLanes(
+            event_types=app.config["NOTIFICATIONS_PRIORITIES"],
+            queues=app.config["NOTIFICATIONS_PRIORITY_QUEUES"],
+            levels=app.config["NOTIFICATIONS_PRIORITY_LEVELS"],
+            weights=app.config["NOTIFICATIONS_PRIORITY_WEIGHTS"]
+        )
+
+        # Token buckets of the rate limits, shared by the workers in Redis
+        if app.config["NOTIFICATIONS_RATE_LIMIT_STORE"] == "redis":
+            self.rate_limit_buckets = RedisTokenBuckets(self.broker)
+        else:
+            self.rate_limit_buckets = LocalTokenBuckets()
+
+        # Ids of the events sent recently, to drop the duplicates
+        window = app.config["NOTIFICATIONS_DEDUPLICATION_WINDOW"]
+        if window:
+            shared = \
+                app.config["NOTIFICATIONS_DEDUPLICATION_STORE"] == "redis"
+            self.deduplicator = Deduplicator(
+                window, app.config["NOTIFICATIONS_DEDUPLICATION_SIZE"],
+                redis=self.broker if shared else None
+            )
+        else:
+            self.deduplicator = None
 
-        imported_module = import_module(".".join(module))
-        self.backend = getattr(imported_module, classname)
+        # The codec of the events is shared with the workers through Celery,
+        # and by all the applications of the process
+        codec_option = app.config["NOTIFICATIONS_CODEC"]
+        process_option = _events_codec.setdefault("option", codec_option)
+        if codec_option != process_option:
+            raise RuntimeError(
+                "The events of this process are serialized with {0}, "
+                "application {1} cannot use {2}.".format(
+                    process_option or "the default codec", app.name,
+                    codec_option or "the default codec")
+            )
+        if codec_option and "codec" not in _events_codec:
+            _events_codec["codec"] = import_class(codec_option)()
+            _events_codec["codec"].register()
+            EventMixin.codec = _events_codec["codec"]
+        self.codec = EventMixin.codec
 
         # Register extension in Flask app
         app.extensions['notifications'] = self
@@ -79,34 +170,187 @@ class Notifications(object):
         )
 
     def send(self, event):
-        """Send an event through to all the hubs."""
-        def consume(hub):
-            hub.consume(event)
-        map(consume, self._hubs.itervalues())
+        """Send an event through to the hubs whose filters may match it.
+
+        The event is serialized once for all the hubs and consumers.
+        Expired events are dropped before evaluating any filter, and
+        counted in :attr dropped:, and so are the events already sent in
+        the deduplication window. An event which fails to be sent is not a
+        duplicate when sent again.
+        """
+        if event.is_expired():
+            self.dropped.increment("send")
+            return
+        if not self._unique([event]):
+            return
+
+        try:
+            with event.serialized_once():
+                for hub in self._hub_index.candidates(event):
+                    hub.consume(event)
+        except Exception:
+            self._forget([event])
+            raise
+
+    def send_many(self, events, chunk_size=None):
+        """Send a stream of events through to the hubs in chunks.
+
+        The events are read in batches of ``chunk_size`` and the filter of
+        every candidate hub is evaluated per batch. The matching events
+        are grouped per hub and every consumer of a hub receives them in
+        chunks of up to ``chunk_size`` events, one task per chunk. Every
+        event is serialized once, whatever the number of hubs matching it.
+        Expired and duplicated events are dropped, as with :method send:.
+        If sending fails, none of the events is a duplicate when sent
+        again, even those already sent.
+
+        :param events: Iterable of events, consumed lazily
+        :param chunk_size: Maximum number of events per task, by default
+                           ``NOTIFICATIONS_SEND_MANY_CHUNK_SIZE``
+        """
+        if chunk_size is None:
+            chunk_size = self.app.config["NOTIFICATIONS_SEND_MANY_CHUNK_SIZE"]
+
+        sent = []
+        try:
+            self._send_many(events, chunk_size, sent)
+        except Exception:
+            self._forget(sent)
+            raise
+
+    def _send_many(self, events, chunk_size, sent):
+        events = iter(events)
+        pending = {}
+        hubs = {}
+        for batch in iter(lambda: list(islice(events, chunk_size)), []):
+            now = time.time()
+            unexpired = [event for event in batch
+                         if not event.is_expired(now)]
+            if len(unexpired) < len(batch):
+                self.dropped.increment("send", len(batch) - len(unexpired))
+
+            unique = self._unique(unexpired)
+            sent.extend(unique)
+
+            candidates = {}
+            for event in unique:
+                for hub in self._hub_index.candidates(event):
+                    hubs[hub.hub_id] = hub
+                    candidates.setdefault(hub.hub_id, []).append(event)
+
+            payloads = {}
+            for hub_id, hub_events in candidates.items():
+                chunk = pending.setdefault(hub_id, ([], []))
+                for event in hub_events:
+                    if hubs[hub_id].matches(event):
+                        key = id(event)
+                        if key not in payloads:
+                            payloads[key] = event.to_json()
+                        chunk[0].append(event)
+                        chunk[1].append(payloads[key])
+                while len(chunk[0]) >= chunk_size:
+                    hubs[hub_id].dispatch_many(chunk[0][:chunk_size],
+                                               chunk[1][:chunk_size])
+                    del chunk[0][:chunk_size], chunk[1][:chunk_size]
+
+        for hub_id, (chunk_events, chunk_payloads) in pending.items():
+            if chunk_events:
+                hubs[hub_id].dispatch_many(chunk_events, chunk_payloads)
+
+    def _unique(self, events):
+        if self.deduplicator is None:
+            return events
+        unique = self.deduplicator.unique(events)
+        if len(unique) < len(events):
+            self.dropped.increment("duplicate", len(events) - len(unique))
+        return unique
+
+    def _forget(self, events):
+        if self.deduplicator is not None and events:
+            self.deduplicator.forget(events)
 
     def sse_notifier_for(self, hub_id):
-        """Create a :class SseNotifier: listening to a hub."""
+        """Create a :class SseNotifier: listening to a hub.
+
+        There is a single notifier per hub, shared by all the clients.
+        """
         try:
             sse_notifier = self._notifiers[hub_id]
         except KeyError:
-            sse_notifier = SseNotifier(self.create_backend(), hub_id)
+            config = self.app.config
+            sse_notifier = SseNotifier(
+                self.create_backend(), hub_id, self.codec,
+                queue_size=config["NOTIFICATIONS_SSE_QUEUE_SIZE"],
+                policy=config["NOTIFICATIONS_SSE_SLOW_CLIENT_POLICY"],
+                heartbeat=config["NOTIFICATIONS_SSE_HEARTBEAT"],
+                replay_events=config["NOTIFICATIONS_SSE_REPLAY_EVENTS"],
+                replay_bytes=config["NOTIFICATIONS_SSE_REPLAY_BYTES"]
+            )
             self._notifiers[hub_id] = sse_notifier
 
         return sse_notifier
 
     def flask_sse_notifier(self, hub_id):
-        """Create a Flask :class Response: that will push notifications."""
-        return Response(self.sse_notifier_for(hub_id),
-                        mimetype='text/event-stream')
+        """Create a Flask :class Response: that will push notifications.
+
+        Reconnecting clients get the notifications they missed since the
+        one given in the ``Last-Event-ID`` header, if still available.
+        """
+        last_event_id = request.headers.get("Last-Event-ID")
+        client = self.sse_notifier_for(hub_id).client(
+            last_event_id=last_event_id
+        )
+        return Response(client, mimetype='text/event-stream')
+
+    def create_hub(self, hub_alias, dispatch=None, priority=None):
+        """Create an EventHub to aggregate certain types of events.
+
+        :param dispatch: Whether there is a task per ``"consumer"`` or per
+                         ``"hub"`` for each event, by default the one of
+                         the configuration
+        :param priority: Lane of the events of the hub without priority of
+                         their own or of their event type
+        """
+        config = self.app.config
+        hub = EventHub(
+            hub_alias, self.celery,
+            max_workers=config["NOTIFICATIONS_EXECUTOR_MAX_WORKERS"],
+            max_pending=config["NOTIFICATIONS_EXECUTOR_MAX_PENDING"],
+            dispatch=dispatch or config["NOTIFICATIONS_HUB_DISPATCH"],
+            dropped=self.dropped, priority=priority, lanes=self.lanes
+        )
+
+        previous_hub = self._hubs.get(hub.hub_id)
+        if previous_hub is not None:
+            previous_hub.filter_changed.disconnect(self._hub_index.update)
 
-    def create_hub(self, hub_alias):
-        """Create an EventHub to aggregate certain types of events."""
-        hub = EventHub(hub_alias, self.celery)
         self._hubs[hub.hub_id] = hub
+        self._hub_index.add(hub)
+        hub.filter_changed.connect(self._hub_index.update, weak=False)
         return hub
 
+    def rate_limit(self, rate, **kwargs):
+        """Create a :class RateLimit: with the token buckets of the extension.
+
+        With **NOTIFICATIONS_RATE_LIMIT_STORE** set to ``"redis"``, the
+        buckets are kept in the broker and shared by every worker.
+        """
+        kwargs.setdefault("buckets", self.rate_limit_buckets)
+        return RateLimit(rate, **kwargs)
+
     def create_backend(self):
-        """Create a PublishSubscribe instance from the specified broker."""
+        """Create a PublishSubscribe instance from the specified broker.
+
+        A :class RedisStreamsBackend: gets its consumer group and name from
+        **NOTIFICATIONS_STREAMS_GROUP** and **NOTIFICATIONS_STREAMS_CONSUMER**.
+        """
+        if issubclass(self.backend, RedisStreamsBackend):
+            config = self.app.config
+            return self.backend(
+                self.broker, group=config["NOTIFICATIONS_STREAMS_GROUP"],
+                consumer=config["NOTIFICATIONS_STREAMS_CONSUMER"],
+                claim_idle=config["NOTIFICATIONS_STREAMS_CLAIM_IDLE"]
+            )
         return self.backend(self.broker)
 
     @staticmethod
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Base class for an asynchronous Publish/Subscribe implementation.
+
+It requires Python 3.6 or later.
+"""
+
+import abc
+
+
+class AsyncBackend(object):
+    """Allows to publish, subscribe and listen to events from asyncio.
+
+    It is the counterpart of :class Backend: where every operation is a
+    coroutine, so that a single event loop can serve many subscribers.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, broker):
+        """Initialise broker."""
+        self.broker = broker
+
+    @abc.abstractmethod
+    async def publish(self, channel, event):
+        """Publish an event to a channel."""
+
+    @abc.abstractmethod
+    async def subscribe(self, channel):
+        """Subscribe to a channel only for this object.
+
+        The :method listen: will receive the published event to
+        the channel.
+        """
+
+    @abc.abstractmethod
+    def listen(self):
+        """Return an async iterator over the messages of the channels.
+
+        The messages have the same format as the ones of :class Backend:.
+        """
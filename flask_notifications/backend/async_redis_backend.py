@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""AsyncRedisBackend declaration.
+
+It requires Python 3.6 or later and the asyncio client of redis-py.
+"""
+
+from flask_notifications.backend.async_backend import AsyncBackend
+
+
+class AsyncRedisBackend(AsyncBackend):
+    """Asynchronous backend implementation using Redis.
+
+    The broker is an instance of :class redis.asyncio.Redis:.
+    """
+
+    def __init__(self, redis):
+        """Initialise and call base class."""
+        super(AsyncRedisBackend, self).__init__(redis)
+        self.pubsub = self.broker.pubsub()
+
+    async def publish(self, channel, event_json):
+        """Publish an event to a channel."""
+        return await self.broker.publish(channel, event_json)
+
+    async def subscribe(self, channel):
+        """Subscribe to a channel."""
+        return await self.pubsub.subscribe(channel)
+
+    def listen(self):
+        """Listen to the subscribed channels."""
+        return self.pubsub.listen()
@@ -26,6 +26,15 @@ class Backend(object):
         """Publish an event to a channel."""
         pass
 
+    def publish_many(self, channel_events):
+        """Publish several events, given as ``(channel, event)`` pairs.
+
+        Return the result of publishing each event. By default, they are
+        published one by one. Override it if the broker can do better.
+        """
+        return [self.publish(channel, event)
+                for channel, event in channel_events]
+
     @abc.abstractmethod
     def subscribe(self, channel):
         """Subscribe to a channel only for this object.
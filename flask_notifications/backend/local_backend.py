@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""LocalBackend declaration."""
+
+import threading
+
+from six.moves import queue
+
+from flask_notifications.backend.backend import Backend
+
+
+class LocalBroker(object):
+    """In-process broker delivering messages to the subscribed backends."""
+
+    def __init__(self):
+        """Initialise a broker without subscribers."""
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        """Deliver a message and return the number of receivers."""
+        with self._lock:
+            receivers = list(self._subscribers.get(channel, ()))
+        for receiver in receivers:
+            receiver.deliver({"type": "message", "pattern": None,
+                              "channel": channel, "data": message})
+        return len(receivers)
+
+    def subscribe(self, channel, receiver):
+        """Deliver the messages of a channel to a receiver.
+
+        Return the number of receivers of the channel.
+        """
+        with self._lock:
+            receivers = self._subscribers.setdefault(channel, set())
+            receivers.add(receiver)
+            return len(receivers)
+
+    def unsubscribe(self, channel, receiver):
+        """Stop delivering the messages of a channel to a receiver.
+
+        Return the number of receivers left in the channel.
+        """
+        with self._lock:
+            receivers = self._subscribers.get(channel, set())
+            receivers.discard(receiver)
+            if not receivers:
+                self._subscribers.pop(channel, None)
+            return len(receivers)
+
+    def __contains__(self, channel):
+        """Check whether a channel has receivers."""
+        return channel in self._subscribers
+
+    def stats(self):
+        """Count the channels and the subscriptions to them."""
+        with self._lock:
+            return {
+                "channels": len(self._subscribers),
+                "subscriptions": sum(len(receivers) for receivers
+                                     in self._subscribers.values())
+            }
+
+
+#: Broker used by the backends created without one
+default_broker = LocalBroker()
+
+
+class LocalBackend(Backend):
+    """Backend implementation for a single process.
+
+    Messages go through in-memory queues and are neither copied nor
+    serialized, so the producer and the subscribers must run in the same
+    process. The messages yielded by :method listen: have the same shape
+    as the ones of :class RedisBackend:.
+
+    It is selected with ``BACKEND = "flask_notifications.backend.
+    local_backend.LocalBackend"``. When no broker is given, all the
+    backends share :data default_broker:.
+    """
+
+    def __init__(self, broker=None):
+        """Initialise and call base class."""
+        super(LocalBackend, self).__init__(broker or default_broker)
+        self.channels = set()
+        self._queue = queue.Queue()
+
+    def publish(self, channel, event_json):
+        """Publish an event to a channel.
+
+        That event will be received by any :class LocalBackend:
+        object of the same broker which is subscribed to that channel.
+        """
+        return self.broker.publish(channel, event_json)
+
+    def subscribe(self, channel):
+        """Subscribe to a channel."""
+        self.broker.subscribe(channel, self)
+        self.channels.add(channel)
+        self.deliver({"type": "subscribe", "pattern": None,
+                      "channel": channel, "data": len(self.channels)})
+
+    def unsubscribe(self, channel):
+        """Unsubscribe from a channel."""
+        self.broker.unsubscribe(channel, self)
+        self.channels.discard(channel)
+        self.deliver({"type": "unsubscribe", "pattern": None,
+                      "channel": channel, "data": len(self.channels)})
+
+    def deliver(self, message):
+        """Queue a message to be yielded by :method listen:."""
+        self._queue.put(message)
+
+    def listen(self):
+        """Listen to the subscribed channels."""
+        while True:
+            yield self._queue.get()
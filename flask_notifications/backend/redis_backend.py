@@ -9,16 +9,171 @@
 
 """RedisBackend declaration."""
 
-from flask_notifications.backend.backend import Backend
+import threading
+import time
+import uuid
 
+from redis.exceptions import ConnectionError
 
-class RedisBackend(Backend):
-    """Backend implementation using Redis."""
+from flask_notifications.backend.local_backend import LocalBackend, \
+    LocalBroker
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def _text(channel):
+    return channel.decode("utf-8") if isinstance(channel, bytes) else channel
+
+
+class RedisDispatcher(object):
+    """Subscription to Redis shared by all the backends of a process.
+
+    The channels of all the :class RedisBackend: objects using the same
+    connection pool are multiplexed over a single pubsub connection. A
+    background thread owns that connection: it applies the changes of
+    subscriptions and routes every message to the backends subscribed to
+    its channel.
+    """
+
+    def __init__(self, redis, timeout=1.0):
+        """Initialise the dispatcher, started on the first subscription.
+
+        :param redis: Redis client whose connection pool is used
+        :param timeout: Seconds to wait for a subscription to be confirmed
+                        and between checks when Redis is unreachable
+        """
+        self.redis = redis
+        self.timeout = timeout
+        self.receivers = LocalBroker()
+        self.pubsub = redis.pubsub()
+
+        # Publishing to the control channel wakes the thread up
+        self.control_channel = \
+            "flask-notifications-dispatcher-{0}".format(uuid.uuid4().hex)
+
+        self._condition = threading.Condition()
+        self._pending = set()
+        self._requested = set()
+        self._subscribed = set()
+        self._thread = None
+
+    @classmethod
+    def for_redis(cls, redis):
+        """Get the dispatcher of the connection pool of a Redis client."""
+        with _dispatchers_lock:
+            dispatcher = _dispatchers.get(redis.connection_pool)
+            if dispatcher is None:
+                dispatcher = cls(redis)
+                _dispatchers[redis.connection_pool] = dispatcher
+            return dispatcher
+
+    def publish(self, channel, message):
+        """Publish a message to a Redis channel."""
+        return self.redis.publish(channel, message)
+
+    def subscribe(self, channel, receiver):
+        """Route the messages of a channel to a receiver.
+
+        It waits for Redis to confirm the subscription, so the messages
+        published afterwards are not missed.
+        """
+        self.receivers.subscribe(channel, receiver)
+        self._update(channel)
+
+        deadline = time.time() + self.timeout
+        with self._condition:
+            while channel not in self._subscribed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+    def unsubscribe(self, channel, receiver):
+        """Stop routing the messages of a channel to a receiver."""
+        self.receivers.unsubscribe(channel, receiver)
+        self._update(channel)
+
+    def stats(self):
+        """Count the connections of the pool and the subscriptions."""
+        pool = self.redis.connection_pool
+        stats = self.receivers.stats()
+        stats.update({
+            "redis_channels": len(self._subscribed),
+            "pool_max_connections": pool.max_connections,
+            "pool_created_connections":
+                getattr(pool, "_created_connections", None),
+            "pool_available_connections":
+                len(getattr(pool, "_available_connections", ())),
+            "pool_in_use_connections":
+                len(getattr(pool, "_in_use_connections", ()))
+        })
+        return stats
+
+    def _update(self, channel):
+        with self._condition:
+            self._pending.add(channel)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+                return
+        self.redis.publish(self.control_channel, "")
+
+    def _apply_pending(self):
+        with self._condition:
+            channels, self._pending = self._pending, set()
+
+        # Only the thread uses the pubsub connection
+        for channel in channels:
+            if channel in self.receivers:
+                if channel not in self._requested:
+                    self.pubsub.subscribe(channel)
+                    self._requested.add(channel)
+            elif channel in self._requested:
+                self.pubsub.unsubscribe(channel)
+                self._requested.discard(channel)
+                with self._condition:
+                    self._subscribed.discard(channel)
+
+    def _run(self):
+        while True:
+            try:
+                if not self.pubsub.subscribed:
+                    self.pubsub.subscribe(self.control_channel)
+                self._apply_pending()
+                message = self.pubsub.get_message(timeout=self.timeout)
+            except ConnectionError:
+                # The pubsub subscribes again to its channels on reconnection
+                time.sleep(self.timeout)
+                continue
+
+            if message is None:
+                continue
+            channel = _text(message["channel"])
+            if message["type"] == "message":
+                if channel != self.control_channel:
+                    self.receivers.publish(channel, message["data"])
+            elif message["type"] == "subscribe":
+                with self._condition:
+                    if channel in self._requested:
+                        self._subscribed.add(channel)
+                    self._condition.notify_all()
+
+
+class RedisBackend(LocalBackend):
+    """Backend implementation using Redis.
+
+    All the backends created from the same Redis connection pool share a
+    :class RedisDispatcher:, that is a single pubsub connection. Each
+    backend still listens only to its own channels, and gets a subscribe
+    message for each of them as with a dedicated connection.
+    """
 
     def __init__(self, redis):
         """Initialise and call base class."""
-        super(RedisBackend, self).__init__(redis)
-        self.pubsub = self.broker.pubsub()
+        super(RedisBackend, self).__init__(RedisDispatcher.for_redis(redis))
+        self.redis = redis
 
     def publish(self, channel, event_json):
         """Publish an event to a channel.
@@ -26,12 +181,18 @@ class RedisBackend(Backend):
         That event will be received by any :class RedisBackend:
         object which is subscribed to that channel.
         """
-        return self.broker.publish(channel, event_json)
+        return self.redis.publish(channel, event_json)
+
+    def publish_many(self, channel_events):
+        """Publish several events in a single round trip to Redis."""
+        pipeline = self.redis.pipeline(transaction=False)
+        for channel, event_json in channel_events:
+            pipeline.publish(channel, event_json)
+        return pipeline.execute()
 
-    def subscribe(self, channel):
-        """Subscribe to a channel."""
-        return self.pubsub.subscribe(channel)
+    def stats(self):
+        """Count the connections of the pool and the subscriptions.
 
-    def listen(self):
-        """Listen to a channel."""
-        return self.pubsub.listen()
+        The counts are shared by all the backends of the connection pool.
+        """
+        return self.broker.stats()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""RedisStreamsBackend declaration."""
+
+import os
+import socket
+import time
+from collections import deque
+
+from redis.exceptions import ResponseError
+
+from flask_notifications.backend.backend import Backend
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class RedisStreamsBackend(Backend):
+    """Durable backend implementation using Redis Streams.
+
+    Every channel is a stream capped to about ``maxlen`` events. The
+    backends sharing a consumer group split the events of a channel
+    between them, and the group keeps the offset of the last event
+    delivered, so a restarted backend resumes where it stopped. Backends
+    which must all get every event, e.g. SSE gateways serving the same
+    hub, need a group each.
+
+    The events are acknowledged once the listener asks for the next one,
+    so those being handled when a backend dies are delivered again to the
+    consumer with the same name when it comes back. A backend also claims
+    the events left pending by the other consumers of its group for more
+    than ``claim_idle`` milliseconds when it subscribes, so the events of
+    a consumer which never comes back are not lost either.
+    """
+
+    def __init__(self, redis, group="flask-notifications", consumer=None,
+                 maxlen=10000, block=1000, count=100, auto_ack=True,
+                 claim_idle=60000):
+        """Initialise and call base class.
+
+        :param redis: Redis client
+        :param group: Name of the consumer group
+        :param consumer: Name of the consumer in the group, which must be
+                         stable across restarts and unique among the
+                         running backends, by default made of the host
+                         name and the process id
+        :param maxlen: Approximate number of events kept in each stream
+        :param block: Milliseconds to wait for new events in each read
+        :param count: Maximum number of events fetched in each read
+        :param auto_ack: Whether events are acknowledged automatically,
+                         otherwise :method ack: must be called
+        :param claim_idle: Milliseconds after which the pending events of
+                           the other consumers are claimed, never if None
+        """
+        super(RedisStreamsBackend, self).__init__(redis)
+        self.group = group
+        self.consumer = consumer or \
+            "{0}-{1}".format(socket.gethostname(), os.getpid())
+        self.maxlen = maxlen
+        self.block = block
+        self.count = count
+        self.auto_ack = auto_ack
+        self.claim_idle = claim_idle
+
+        # Offset to read from in each stream: "0" goes over the events
+        # delivered but not acknowledged, and ">" reads the new ones
+        self.streams = {}
+        self._messages = deque()
+
+    def publish(self, channel, event_json):
+        """Append an event to the stream of a channel and return its id."""
+        return self.broker.xadd(channel, {"data": event_json},
+                                maxlen=self.maxlen, approximate=True)
+
+    def publish_many(self, channel_events):
+        """Append several events in a single round trip to Redis."""
+        pipeline = self.broker.pipeline(transaction=False)
+        for channel, event_json in channel_events:
+            pipeline.xadd(channel, {"data": event_json},
+                          maxlen=self.maxlen, approximate=True)
+        return pipeline.execute()
+
+    def subscribe(self, channel):
+        """Subscribe to a channel, creating its stream and group if needed.
+
+        A new group only gets the events published after its creation.
+        """
+        try:
+            self.broker.xgroup_create(channel, self.group, id="$",
+                                      mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        if self.claim_idle is not None:
+            self.claim(channel, self.claim_idle)
+        self.streams.setdefault(channel, "0")
+        self._messages.append({"type": "subscribe", "pattern": None,
+                               "channel": channel,
+                               "data": len(self.streams)})
+
+    def claim(self, channel, min_idle):
+        """Claim the events of a channel pending for too long in the group.
+
+        They are delivered again by :method listen:, like the events of
+        the consumer which were not acknowledged.
+
+        :param min_idle: Milliseconds since the events were delivered
+        :returns: The number of events claimed
+        """
+        claimed = 0
+        start = "0-0"
+        while True:
+            response = self.broker.xautoclaim(
+                channel, self.group, self.consumer, min_idle,
+                start_id=start, count=self.count
+            )
+            start, entries = _text(response[0]), response[1]
+            claimed += len(entries)
+            if start == "0-0":
+                return claimed
+
+    def ack(self, channel, *event_ids):
+        """Acknowledge events of a channel."""
+        return self.broker.xack(channel, self.group, *event_ids)
+
+    def offsets(self):
+        """Get the id of the last event delivered to the group per channel."""
+        offsets = {}
+        for channel in self.streams:
+            for group in self.broker.xinfo_groups(channel):
+                if _text(group["name"]) == self.group:
+                    offsets[channel] = _text(group["last-delivered-id"])
+        return offsets
+
+    def listen(self):
+        """Listen to the subscribed channels.
+
+        The messages have the id of the event in the stream.
+        """
+        while True:
+            while self._messages:
+                yield self._messages.popleft()
+
+            if not self.streams:
+                time.sleep(self.block / 1000.0)
+                continue
+
+            response = self.broker.xreadgroup(
+                self.group, self.consumer, dict(self.streams),
+                count=self.count, block=self.block
+            )
+            for stream, entries in response or ():
+                channel = _text(stream)
+                if not entries:
+                    # Every event delivered before has been acknowledged
+                    self.streams[channel] = ">"
+                    continue
+
+                for event_id, fields in entries:
+                    if self.streams[channel] != ">":
+                        self.streams[channel] = event_id
+                    if fields:
+                        data = fields.get(b"data", fields.get("data"))
+                        yield {"type": "message", "pattern": None,
+                               "channel": channel, "data": data,
+                               "id": _text(event_id)}
+                    # Events trimmed from the stream have no fields
+                    if self.auto_ack or not fields:
+                        self.ack(channel, event_id)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Base class for the serialization of events."""
+
+import abc
+import calendar
+import datetime
+import time
+
+from kombu.serialization import register
+
+
+def to_timestamp(value):
+    """Convert datetimes into seconds since the epoch.
+
+    Naive datetimes are considered local, as returned by
+    :method datetime.datetime.now:.
+    """
+    if not isinstance(value, datetime.datetime):
+        raise TypeError("{0!r} is not serializable".format(value))
+    if value.tzinfo is None:
+        seconds = time.mktime(value.timetuple())
+    else:
+        seconds = calendar.timegm(value.utctimetuple())
+    return seconds + value.microsecond / 1e6
+
+
+class Codec(object):
+    """Serialize events and the Celery messages carrying them.
+
+    A codec is registered as a Celery serializer with its ``name``, so the
+    tasks sending serialized events can use it as ``serializer``.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    #: Name of the serializer in Celery
+    name = None
+
+    #: Content type and encoding of the serialized data
+    content_type = None
+    content_encoding = "utf-8"
+
+    #: Whether the serialized data is binary rather than text
+    binary = False
+
+    @abc.abstractmethod
+    def dumps(self, obj):
+        """Serialize any object, converting its datetimes."""
+
+    @abc.abstractmethod
+    def loads(self, data):
+        """Deserialize data serialized with :method dumps:."""
+
+    def decode_datetime(self, value, event_cls):
+        """Convert back a datetime serialized with :method dumps:."""
+        return datetime.datetime.fromtimestamp(value)
+
+    def encode(self, event):
+        """Serialize an event."""
+        return self.dumps(event.data)
+
+    def decode(self, payload, event_cls):
+        """Deserialize an event into a dictionary of its fields.
+
+        :param event_cls: Class of the event, whose schema gives the fields
+                          that hold datetimes
+        """
+        d = self.loads(payload)
+        for field in event_cls.datetime_fields():
+            value = d.get(field)
+            if value is not None:
+                d[field] = self.decode_datetime(value, event_cls)
+        return d
+
+    def to_text(self, payload):
+        """Get a JSON text from an event serialized with this codec."""
+        return payload
+
+    def from_text(self, text):
+        """Serialize again an event converted by :method to_text:."""
+        return text
+
+    def register(self):
+        """Register the codec as a Celery serializer."""
+        register(self.name, self.dumps, self.loads,
+                 content_type=self.content_type,
+                 content_encoding=self.content_encoding)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Codec using the JSON encoder of Flask."""
+
+from flask.json import dumps, loads
+
+from flask_notifications.codecs.codec import Codec
+
+
+class FlaskJSONCodec(Codec):
+    """Serialize events with the JSON encoder of Flask.
+
+    Datetimes are encoded as RFC 1123 strings and decoded back with
+    :method Event.to_datetime:. This is the default codec, and it relies on
+    the serializer configured in Celery, so it does not need to be
+    registered.
+    """
+
+    name = None
+    content_type = "application/json"
+
+    def dumps(self, obj):
+        """Serialize with Flask."""
+        return dumps(obj)
+
+    def loads(self, data):
+        """Deserialize with Flask."""
+        return loads(data)
+
+    def decode_datetime(self, value, event_cls):
+        """By default, datetime are not decoded correctly."""
+        return event_cls.to_datetime(value)
+
+    def register(self):
+        """Use the serializer configured in Celery."""
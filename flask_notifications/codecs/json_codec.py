@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Codec using the JSON module of the standard library."""
+
+import json
+
+from flask_notifications.codecs.codec import Codec, to_timestamp
+
+
+class JSONCodec(Codec):
+    """Serialize events as compact JSON with datetimes as epoch values."""
+
+    name = "notifications-json"
+    content_type = "application/x-notifications-json"
+
+    def dumps(self, obj):
+        """Serialize with the standard library."""
+        return json.dumps(obj, default=to_timestamp, separators=(",", ":"))
+
+    def loads(self, data):
+        """Deserialize with the standard library."""
+        if isinstance(data, bytes):
+            data = data.decode(self.content_encoding)
+        return json.loads(data)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Codec using MessagePack."""
+
+import json
+
+import msgpack
+
+from flask_notifications.codecs.codec import Codec, to_timestamp
+
+
+class MsgpackCodec(Codec):
+    """Serialize events as MessagePack with datetimes as epoch values."""
+
+    name = "notifications-msgpack"
+    content_type = "application/x-notifications-msgpack"
+    content_encoding = "binary"
+    binary = True
+
+    def dumps(self, obj):
+        """Serialize with MessagePack."""
+        return msgpack.packb(obj, default=to_timestamp, use_bin_type=True)
+
+    def loads(self, data):
+        """Deserialize with MessagePack."""
+        return msgpack.unpackb(data, raw=False)
+
+    def to_text(self, payload):
+        """Convert the event to JSON, e.g. to push it to a browser."""
+        return json.dumps(self.loads(payload), separators=(",", ":"))
+
+    def from_text(self, text):
+        """Convert the JSON of an event back to MessagePack."""
+        return self.dumps(json.loads(text))
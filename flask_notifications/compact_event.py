@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Compact representation of an event."""
+
+import datetime
+import time
+import uuid
+
+from flask_notifications.event import EventMixin
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+class CompactEvent(EventMixin, MutableMapping):
+    """Event storing the fields of the schema in slots.
+
+    It behaves as a :class Event: but without the wrapped dictionary of
+    :class UserDict:. Only the fields that are not part of the schema are
+    stored in a dictionary, created on demand. By default, ``recipients``
+    and ``tags`` are empty tuples shared by all the events.
+    """
+
+    fields = ("event_id", "event_type", "title", "body", "timestamp",
+              "sender", "recipients", "tags", "expiration_datetime")
+
+    __slots__ = fields + ("_extra", "_payload")
+
+    _field_set = frozenset(fields)
+
+    schema_types = {"datetime": datetime.datetime, "array": (list, tuple)}
+
+    def __init__(self, event_id, event_type, title, body,
+                 timestamp=None, sender="", recipients=(),
+                 tags=(), expiration_datetime=None, **kwargs):
+        """Initialize event and default non-existing values."""
+        self.event_id = event_id or str(uuid.uuid4())
+        self.event_type = event_type
+        self.title = title
+        self.body = body
+        self.timestamp = timestamp or time.time()
+        self.sender = sender
+        self.recipients = recipients
+        self.tags = tags
+        self.expiration_datetime = expiration_datetime
+        self._extra = kwargs or None
+        self.validate()
+
+    @classmethod
+    def trusted(cls, d):
+        """Create an event from a dictionary without validating it."""
+        event = cls.__new__(cls)
+        event._extra = None
+        for key, value in d.items():
+            event[key] = value
+        return event
+
+    @property
+    def data(self):
+        """Get a dictionary with all the fields of the event."""
+        return dict(self.items())
+
+    def __getitem__(self, key):
+        """Get a field of the event."""
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        """Set a field of the event."""
+        if key in self._field_set:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        """Delete a field of the event."""
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        """Iterate over the names of the fields that are set."""
+        for field in self.fields:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            for key in self._extra:
+                yield key
+
+    def __len__(self):
+        """Return the number of fields that are set."""
+        return (sum(1 for field in self.fields if hasattr(self, field)) +
+                len(self._extra or ()))
+
+    def __repr__(self):
+        """Represent the event as its dictionary."""
+        return repr(self.data)
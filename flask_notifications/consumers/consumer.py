@@ -10,6 +10,32 @@
 """Consumer declaration."""
 
 import abc
+import atexit
+import logging
+import weakref
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Consumers closed when the process exits, unless collected before
+_closed_at_exit = weakref.WeakValueDictionary()
+
+
+def close_at_exit(consumer):
+    """Call the ``close`` method of a consumer when the process exits.
+
+    The consumer is not kept alive by this registration.
+    """
+    _closed_at_exit[id(consumer)] = consumer
+
+
+@atexit.register
+def _close_consumers():
+    for consumer in list(_closed_at_exit.values()):
+        try:
+            consumer.close()
+        except Exception:
+            logger.exception("Closing consumer %s failed", consumer.__name__)
 
 
 class Consumer(object):
@@ -45,6 +71,29 @@ class Consumer(object):
     def consume(self, event_json, *args, **kwargs):
         """Real logic of the consumer."""
 
+    @contextmanager
+    def hooks(self, events_json, *args, **kwargs):
+        """Run the hooks of every event of a chunk around its consumption.
+
+        Overrides of :method consume_many: consume the chunk within it,
+        so the hooks run as they do for a single event.
+        """
+        for event_json in events_json:
+            self.before_consume(event_json, *args, **kwargs)
+        yield
+        for event_json in events_json:
+            self.after_consume(event_json, *args, **kwargs)
+
+    def consume_many(self, events_json, *args, **kwargs):
+        """Consume a chunk of events.
+
+        By default, every event is consumed on its own. Override it
+        if the consumer can do better with several events at once,
+        within :method hooks:.
+        """
+        for event_json in events_json:
+            self(event_json, *args, **kwargs)
+
     @property
     def __name__(self):
         """Get name of class."""
@@ -10,24 +10,87 @@
 """Declaration of a generic EmailConsumer."""
 
 import abc
+import os
+import smtplib
+import socket
+import threading
+
+from six import get_unbound_function
+
 from flask_notifications.consumers.consumer import Consumer
+from flask_notifications.event import Event
+
+# Errors after which the message is sent again through a new connection
+_connection_errors = (smtplib.SMTPServerDisconnected, socket.error)
+# Errors of the message itself, some of them are socket errors too
+_message_errors = (smtplib.SMTPResponseException,
+                   smtplib.SMTPRecipientsRefused)
 
 
 class EmailConsumer(Consumer):
-    """Base class of an Email consumer."""
+    """Base class of an Email consumer.
+
+    An event is sent to its own recipients, as blind copies in messages
+    of at most ``recipients_per_message`` recipients, or to the fixed
+    ``recipients`` if it has none. The subject and body are rendered once
+    per event, with :class EmailTemplates: if given, otherwise the body is
+    the event without its recipients, who must not see each other.
+
+    The consumer keeps a connection to the mail server open, per process,
+    for at most ``max_messages`` messages. If the connection is lost, it
+    is opened again and the message sent once more. By default, the
+    connection is the mail extension itself.
+
+    Subclasses implement :method build_message:, or override
+    :method create_message: to create the single email of an event.
+    """
 
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, mail, sender=None, recipients=[]):
+    def __init__(self, mail, sender=None, recipients=[], max_messages=100,
+                 templates=None, recipients_per_message=50, event_class=Event):
         """Initialize of the email dependency, which inherits Consumer.
 
         :param mail: Instance of the extension already initialized with app
         :param sender: Who is sending the notification
         :param recipients: Addresses that will receive a notification
+        :param max_messages: Messages sent through a connection before
+                             opening a new one
+        :param templates: :class EmailTemplates: to render the emails, by
+                          default the body is the event itself
+        :param recipients_per_message: Maximum number of recipients of the
+                                       event addressed by a message
+        :param event_class: Class of the consumed events
         """
         self.mail = mail
         self.sender = sender
         self.recipients = recipients
+        self.max_messages = max_messages
+        self.templates = templates
+        self.recipients_per_message = recipients_per_message
+        self.event_class = event_class
+        self._init_state()
+
+    def _init_state(self):
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+        self._sent = 0
+
+    def __getstate__(self):
+        """Pickle the consumer without its connection and lock.
+
+        The mail extension must be picklable too, to run in a process pool.
+        """
+        state = self.__dict__.copy()
+        for name in ("_lock", "_connection", "_pid", "_sent"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled consumer, which opens its own connection."""
+        self.__dict__.update(state)
+        self._init_state()
 
     @classmethod
     @abc.abstractmethod
@@ -38,10 +101,115 @@ class EmailConsumer(Consumer):
                     the existing one
         """
 
-    @abc.abstractmethod
-    def create_message(self, event_json):
-        """Create the email that will be sent.
+    def build_message(self, subject, body, recipients=(), bcc=()):
+        """Build a message of the mail extension."""
+        raise NotImplementedError(
+            "{0} must implement build_message or create_message".format(
+                type(self).__name__)
+        )
+
+    def render(self, event, event_json):
+        """Render the ``(subject, body)`` of the emails of an event."""
+        if self.templates is not None:
+            return self.templates.render(event)
+        data = dict(event.data)
+        data.pop("recipients", None)
+        codec = self.event_class.codec
+        return ("Event {0}".format(event["event_id"]),
+                codec.to_text(codec.dumps(data)))
+
+    def recipient_address(self, recipient):
+        """Get the email address of a recipient of an event.
+
+        Override it if the recipients of the events are not addresses.
+        """
+        return recipient
+
+    def create_messages(self, event_json):
+        """Create the emails that will be sent for an event.
 
         If you want to custom the notification that your user
-        will receive from an event, extend and override this method.
+        will receive from an event, extend and override :method render:.
+        If :method create_message: is overridden, it creates the only
+        email of the event instead.
         """
+        if get_unbound_function(type(self).create_message) is not \
+                get_unbound_function(EmailConsumer.create_message):
+            return [self.create_message(event_json)]
+
+        event = self.event_class.from_json(event_json, trusted=True)
+        subject, body = self.render(event, event_json)
+
+        addresses = [self.recipient_address(recipient)
+                     for recipient in event.get("recipients") or ()]
+        if not addresses:
+            return [self.build_message(subject, body, self.recipients)]
+
+        chunk = self.recipients_per_message
+        return [self.build_message(subject, body, bcc=addresses[i:i + chunk])
+                for i in range(0, len(addresses), chunk)]
+
+    def create_message(self, event_json):
+        """Create the email that will be sent for an event.
+
+        By default, it is the first email of :method create_messages:.
+        Override it to send a single email of your own per event.
+        """
+        return self.create_messages(event_json)[0]
+
+    def open_connection(self):
+        """Open a connection to the mail server, by default the extension."""
+        return self.mail
+
+    def send_message(self, connection, message):
+        """Send a message through an open connection."""
+        connection.send(message)
+
+    def close_connection(self, connection):
+        """Close a connection to the mail server, nothing by default."""
+
+    def consume(self, event_json, *args, **kwargs):
+        """Consume an event sending it as emails."""
+        self.send(self.create_messages(event_json))
+
+    def consume_many(self, events_json, *args, **kwargs):
+        """Consume a chunk of events sending them through one connection."""
+        events_json = list(events_json)
+        with self.hooks(events_json, *args, **kwargs):
+            self.send([message for event_json in events_json
+                       for message in self.create_messages(event_json)])
+
+    def send(self, messages):
+        """Send messages reusing the open connection."""
+        with self._lock:
+            for message in messages:
+                try:
+                    self.send_message(self._get_connection(), message)
+                except _connection_errors as error:
+                    if isinstance(error, _message_errors):
+                        raise
+                    self.close()
+                    self.send_message(self._get_connection(), message)
+
+                self._sent += 1
+                if self._sent >= self.max_messages:
+                    self.close()
+
+    def close(self):
+        """Close the open connection, if any."""
+        with self._lock:
+            connection, self._connection = self._connection, None
+            self._sent = 0
+            # A forked worker must not close the connection of its parent
+            if connection is not None and self._pid == os.getpid():
+                try:
+                    self.close_connection(connection)
+                except _connection_errors:
+                    pass
+
+    def _get_connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = self.open_connection()
+            self._pid = os.getpid()
+            self._sent = 0
+        return self._connection
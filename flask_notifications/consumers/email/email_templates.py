@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Templates of the emails sent for the events."""
+
+from flask import current_app
+from jinja2 import TemplateNotFound
+from jinja2.utils import LRUCache
+
+
+class EmailTemplates(object):
+    """Jinja templates of the subject and body of the emails per event type.
+
+    The templates of an event type are looked up once and kept in a
+    bounded cache. Event types without templates use the ones of
+    ``default_type``. Without subject template, the subject is
+    ``Event <event_id>``. The templates get the ``event``.
+    """
+
+    def __init__(self, environment=None,
+                 body="notifications/email/{0}.txt",
+                 subject="notifications/email/{0}_subject.txt",
+                 default_type="default", cache_size=100):
+        """Initialise the names of the templates and the cache.
+
+        :param environment: Jinja environment, by default the one of the
+                            current Flask application
+        :param body: Name of the body templates, formatted with the type
+        :param subject: Name of the subject templates
+        :param default_type: Type whose templates are used by default
+        :param cache_size: Number of event types kept in the cache
+        """
+        self.environment = environment
+        self.body = body
+        self.subject = subject
+        self.default_type = default_type
+        self._cache = LRUCache(cache_size)
+
+    def templates(self, event_type):
+        """Get the ``(subject, body)`` templates of an event type."""
+        templates = self._cache.get(event_type)
+        if templates is None:
+            templates = (self._get(self.subject, event_type),
+                         self._get(self.body, event_type))
+            if templates[1] is None:
+                raise TemplateNotFound(self.body.format(event_type))
+            self._cache[event_type] = templates
+        return templates
+
+    def render(self, event):
+        """Render the ``(subject, body)`` of the email of an event."""
+        subject, body = self.templates(event["event_type"])
+        if subject is None:
+            subject = "Event {0}".format(event["event_id"])
+        else:
+            subject = subject.render(event=event).strip()
+        return subject, body.render(event=event)
+
+    def _get(self, name, event_type):
+        environment = self.environment or current_app.jinja_env
+        for template_type in (event_type, self.default_type):
+            try:
+                return environment.get_template(name.format(template_type))
+            except TemplateNotFound:
+                continue
+        return None
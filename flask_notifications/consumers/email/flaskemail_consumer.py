@@ -10,41 +10,45 @@
 """Email consumer using the Flask-Mail extension."""
 
 from flask.ext.email import EmailMessage, SMTPMail
-from flask_notifications.event import Event
 from flask_notifications.consumers.email.email_consumer import EmailConsumer
 
 
 class FlaskEmailConsumer(EmailConsumer):
     """Send an email using the Flask-Email extension."""
 
-    def __init__(self, mail, sender=None, recipients=[]):
+    def __init__(self, mail, sender=None, recipients=[], **kwargs):
         """Initialize Flask-Email extension.
 
         :param mail: This object represents the Flask-Email mailbox
         """
         super(FlaskEmailConsumer, self).__init__(
-            mail, sender, recipients
+            mail, sender, recipients, **kwargs
         )
 
     @classmethod
-    def from_app(cls, app, sender=None, recipients=[]):
+    def from_app(cls, app, sender=None, recipients=[], **kwargs):
         """Return a new instance of SMTP using Flask-Email always.
 
         Flask-Email does not register itself to the extensions
         array in the app. The backend created is SmtpMail by default.
         """
         mail = SMTPMail(app, fail_silently=False)
-        return cls(mail, sender, recipients)
-
-    def create_message(self, event_json):
-        """Create a message from an event."""
-        event = Event.from_json(event_json)
-        return EmailMessage(
-            "Event {0}".format(event['event_id']),
-            event_json, self.sender, self.recipients
-        )
+        return cls(mail, sender, recipients, **kwargs)
+
+    def build_message(self, subject, body, recipients=(), bcc=()):
+        """Build a Flask-Email message."""
+        return EmailMessage(subject, body, self.sender, list(recipients),
+                            list(bcc))
+
+    def open_connection(self):
+        """Open the connection of the mailbox, which is reused."""
+        self.mail.open()
+        return self.mail
+
+    def send_message(self, connection, message):
+        """Send a message through the open connection of the mailbox."""
+        connection.send_messages([message])
 
-    def consume(self, event_json, *args, **kwargs):
-        """Consume an event sending it as an email."""
-        email = self.create_message(event_json)
-        return email.send(self.mail)
+    def close_connection(self, connection):
+        """Close the connection of the mailbox."""
+        connection.close()
@@ -11,35 +11,42 @@
 
 from flask.ext.mail import Mail, Message
 
-from flask_notifications.event import Event
 from flask_notifications.consumers.email.email_consumer import EmailConsumer
 
 
 class FlaskMailConsumer(EmailConsumer):
     """Send an email using the Flask-Mail extension."""
 
-    def __init__(self, mail, sender=None, recipients=[]):
+    def __init__(self, mail, sender=None, recipients=[], **kwargs):
         """Initialise FlaskMail app."""
         super(FlaskMailConsumer, self).__init__(
-            mail, sender, recipients
+            mail, sender, recipients, **kwargs
         )
 
     @classmethod
-    def from_app(cls, app, sender=None, recipients=[]):
+    def from_app(cls, app, sender=None, recipients=[], **kwargs):
         """Get or create mail extension from app."""
         mail = Mail(app) if 'mail' not in app.extensions else \
             app.extensions['mail']
-        return cls(mail, sender, recipients)
+        return cls(mail, sender, recipients, **kwargs)
 
-    def create_message(self, event_json):
-        """Create a message from an event."""
-        event = Event.from_json(event_json)
-        return Message(subject="Event {0}".format(event["event_id"]),
+    def build_message(self, subject, body, recipients=(), bcc=()):
+        """Build a Flask-Mail message."""
+        return Message(subject=subject,
                        sender=self.sender,
-                       recipients=self.recipients,
-                       body=event_json)
-
-    def consume(self, event_json, *args, **kwargs):
-        """Consume an event sending it as an email."""
-        message = self.create_message(event_json)
-        self.mail.send(message)
+                       recipients=list(recipients),
+                       bcc=list(bcc),
+                       body=body)
+
+    def open_connection(self):
+        """Open a connection with :method Mail.connect:."""
+        connection = self.mail.connect()
+        return connection.__enter__()
+
+    def send_message(self, connection, message):
+        """Send a message through a Flask-Mail connection."""
+        connection.send(message)
+
+    def close_connection(self, connection):
+        """Close a Flask-Mail connection."""
+        connection.__exit__(None, None, None)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Consumer that archives the events in indexed segments."""
+
+import glob
+import io
+import mmap
+import os
+
+from flask_notifications.codecs.codec import to_timestamp
+from flask_notifications.consumers.log.log_consumer import FSYNC_COMMIT, \
+    FSYNC_NEVER, LogConsumer
+from flask_notifications.event import Event
+from flask_notifications.lru import LRUDict
+
+SEGMENT_SUFFIX = ".log"
+TIME_INDEX_SUFFIX = ".idx"
+ID_INDEX_SUFFIX = ".ids"
+
+
+def segment_name(number, pid):
+    """Get the name of the segment of a number written by a process."""
+    return "{0:010d}-{1}".format(number, pid)
+
+
+def segment_path(directory, segment, suffix=SEGMENT_SUFFIX):
+    """Get the path of a file of a segment."""
+    return os.path.join(directory, segment + suffix)
+
+
+def segment_names(directory):
+    """Get the names of the segments in a directory, in order."""
+    paths = glob.glob(os.path.join(directory, "*" + SEGMENT_SUFFIX))
+    names = [os.path.basename(path)[:-len(SEGMENT_SUFFIX)] for path in paths]
+    return sorted(names, key=lambda name: tuple(
+        int(part) for part in name.split("-")
+    ))
+
+
+def _line(codec, payload):
+    text = codec.to_text(payload)
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    return u"{0}\n".format(text).encode("utf-8")
+
+
+class ArchiveConsumer(LogConsumer):
+    """Archive the events in segment files with indexes.
+
+    Events are written one per line, as with :class LogConsumer:, to
+    numbered segments of about ``segment_bytes``. Each segment has two
+    indexes, read by :class ArchiveReader::
+
+    * a sparse time index, with a line ``start end min max`` for each
+      block of about ``index_interval`` bytes of the segment, giving the
+      range of timestamps of its events, which do not need to be ordered.
+    * an event id index, with a line ``event_id offset`` for each event.
+
+    A new segment is started every time the consumer is created. The name
+    of the segments holds the id of the process writing them, so several
+    workers can archive to the same directory.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024,
+                 index_interval=64 * 1024, commit_events=100,
+                 commit_interval=0.05, fsync=FSYNC_NEVER,
+                 rotate_interval=None, event_cls=Event):
+        """Initialise the directory and the first segment.
+
+        :param directory: Directory of the segments, created if needed
+        :param segment_bytes: Size of a segment that starts a new one
+        :param index_interval: Size of the blocks of the time index
+        :param event_cls: Class of the archived events, whose codec
+                          decodes them
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.index_interval = index_interval
+        self.event_cls = event_cls
+        self.number = max([int(name.split("-")[0])
+                           for name in segment_names(directory)] or [0]) + 1
+
+        super(ArchiveConsumer, self).__init__(
+            self._segment_path(), commit_events=commit_events,
+            commit_interval=commit_interval, fsync=fsync,
+            max_bytes=segment_bytes, rotate_interval=rotate_interval
+        )
+
+    def archive(self, events):
+        """Archive events, taking their id and timestamp from them."""
+        frames = [(_line(event.codec, event.to_json()), event["event_id"],
+                   float(event["timestamp"])) for event in events]
+        with self._lock:
+            self._lines.extend(frames)
+            self.commit()
+
+    def rotate(self):
+        """Start a new segment."""
+        with self._lock:
+            self._close_file()
+            self.number += 1
+            self.filepath = self._segment_path()
+
+    def path(self):
+        """Get the path of the segment written by this process."""
+        return self.filepath
+
+    def _init_state(self):
+        super(ArchiveConsumer, self)._init_state()
+        self._indexes = None
+        self._block = None
+
+    def __getstate__(self):
+        """Pickle the consumer without its segment and indexes."""
+        state = super(ArchiveConsumer, self).__getstate__()
+        del state["_indexes"], state["_block"]
+        return state
+
+    def _segment_path(self):
+        return segment_path(self.directory,
+                            segment_name(self.number, os.getpid()))
+
+    def _frame(self, event_json):
+        # The payload is decoded once, before taking the lock
+        codec = self.event_cls.codec
+        data = codec.loads(event_json)
+        return (_line(codec, event_json), data["event_id"],
+                float(data["timestamp"]))
+
+    def _open(self):
+        if self._pid != os.getpid():
+            # A forked worker writes its own segment and indexes
+            self.filepath = self._segment_path()
+            self._indexes = None
+            self._block = None
+        return super(ArchiveConsumer, self)._open()
+
+    def _write(self, frames):
+        offset = self._open().tell()
+        time_index, id_index = self._open_indexes()
+
+        ids = []
+        for line, event_id, timestamp in frames:
+            if self._block is None:
+                self._block = [offset, timestamp, timestamp]
+            else:
+                self._block[1] = min(self._block[1], timestamp)
+                self._block[2] = max(self._block[2], timestamp)
+            ids.append(u"{0}\t{1}\n".format(event_id, offset))
+
+            offset += len(line)
+            if offset - self._block[0] >= self.index_interval:
+                self._write_block(offset)
+
+        super(ArchiveConsumer, self)._write([frame[0] for frame in frames])
+        id_index.write(u"".join(ids).encode("utf-8"))
+        for index in self._indexes:
+            index.flush()
+            if self.fsync == FSYNC_COMMIT:
+                os.fsync(index.fileno())
+
+    def _write_block(self, end):
+        start, minimum, maximum = self._block
+        self._indexes[0].write("{0} {1} {2!r} {3!r}\n".format(
+            start, end, minimum, maximum
+        ).encode("utf-8"))
+        self._block = None
+
+    def _open_indexes(self):
+        if self._indexes is None:
+            stem = self.filepath[:-len(SEGMENT_SUFFIX)]
+            self._indexes = tuple(
+                io.open(stem + suffix, "ab")
+                for suffix in (TIME_INDEX_SUFFIX, ID_INDEX_SUFFIX)
+            )
+        return self._indexes
+
+    def _close_file(self):
+        if self._file is not None and self._pid == os.getpid() and \
+                self._block is not None:
+            self._write_block(self._file.tell())
+        self._block = None
+
+        if self._indexes is not None:
+            for index in self._indexes:
+                index.flush()
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(index.fileno())
+                index.close()
+            self._indexes = None
+        super(ArchiveConsumer, self)._close_file()
+
+
+class ArchiveReader(object):
+    """Read the events archived by an :class ArchiveConsumer:.
+
+    The segments are memory-mapped and only the blocks whose time range
+    overlaps the requested one are parsed. The event id index of each
+    segment is loaded in memory the first time it is needed, and extended
+    as the segment grows. The indexes of the least recently used segments
+    are forgotten beyond ``max_segments``.
+    """
+
+    def __init__(self, directory, event_cls=Event, max_segments=16):
+        """Initialise the directory and the class of the events.
+
+        :param directory: Directory of the segments
+        :param event_cls: Class used to parse the events
+        :param max_segments: Maximum number of id indexes kept in memory
+        """
+        self.directory = directory
+        self.event_cls = event_cls
+        self._ids = LRUDict(max_segments)
+
+    def segments(self):
+        """Get the names of the segments, in order."""
+        return segment_names(self.directory)
+
+    def blocks(self, segment):
+        """Get the ``(start, end, min, max)`` blocks of a segment."""
+        path = segment_path(self.directory, segment, TIME_INDEX_SUFFIX)
+        if not os.path.exists(path):
+            return []
+        with io.open(path, "rb") as f:
+            return [(int(start), int(end), float(minimum), float(maximum))
+                    for start, end, minimum, maximum
+                    in (line.split() for line in f if line.endswith(b"\n"))]
+
+    def events(self, start=None, end=None):
+        """Stream the events with a timestamp in ``[start, end)``.
+
+        The bounds are timestamps or datetimes. The events are yielded in
+        the order they were archived.
+        """
+        start = self._timestamp(start, float("-inf"))
+        end = self._timestamp(end, float("inf"))
+
+        for segment in self.segments():
+            ranges = []
+            indexed = 0
+            for block_start, block_end, minimum, maximum \
+                    in self.blocks(segment):
+                if maximum >= start and minimum < end:
+                    ranges.append((block_start, block_end))
+                indexed = block_end
+            # The events written after the last block may be in the range
+            ranges.append((indexed, None))
+
+            for event in self._read(segment, ranges):
+                if start <= float(event["timestamp"]) < end:
+                    yield event
+
+    def get(self, event_id):
+        """Get the last event archived with an id, or None."""
+        for segment in reversed(self.segments()):
+            offset = self.id_index(segment).get(event_id)
+            if offset is not None:
+                for event in self._read(segment, [(offset, None)]):
+                    return event
+        return None
+
+    def id_index(self, segment):
+        """Get the offset of each event id of a segment."""
+        position, offsets = self._ids.get(segment, (0, {}))
+        path = segment_path(self.directory, segment, ID_INDEX_SUFFIX)
+        if os.path.exists(path) and os.path.getsize(path) > position:
+            with io.open(path, "rb") as f:
+                f.seek(position)
+                for line in f:
+                    # A last line without newline is not written yet
+                    if not line.endswith(b"\n"):
+                        break
+                    position += len(line)
+                    line_id, _, line_offset = \
+                        line.decode("utf-8")[:-1].rpartition("\t")
+                    offsets[line_id] = int(line_offset)
+        self._ids[segment] = (position, offsets)
+        return offsets
+
+    def _read(self, segment, ranges):
+        with io.open(segment_path(self.directory, segment), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            archive = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                for position, range_end in ranges:
+                    range_end = size if range_end is None \
+                        else min(range_end, size)
+                    while position < range_end:
+                        newline = archive.find(b"\n", position, range_end)
+                        # A last line without newline is not written yet
+                        if newline < 0:
+                            break
+                        event_json = archive[position:newline].decode("utf-8")
+                        position = newline + 1
+                        yield self.event_cls.from_json(
+                            self.event_cls.codec.from_text(event_json)
+                        )
+            finally:
+                archive.close()
+
+    @staticmethod
+    def _timestamp(value, default):
+        if value is None:
+            return default
+        if hasattr(value, "timetuple"):
+            return to_timestamp(value)
+        return float(value)
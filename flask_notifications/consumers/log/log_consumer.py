@@ -8,17 +8,115 @@
 
 """Consumer that writes the events to a file."""
 
-from flask_notifications.consumers.consumer import Consumer
+import io
+import logging
+import os
+import threading
+import time
+
+from flask_notifications.consumers.consumer import Consumer, close_at_exit
+from flask_notifications.event import EventMixin
+
+logger = logging.getLogger(__name__)
+
+#: Never call fsync, the operating system writes the file when it wants
+FSYNC_NEVER = "never"
+#: Call fsync after every group commit
+FSYNC_COMMIT = "commit"
+#: Call fsync only before rotating or closing the file
+FSYNC_ROTATE = "rotate"
+
+
+def read_events(filepath, event_cls=None):
+    """Read the events written by a :class LogConsumer: to a file.
+
+    Every line is an event, as JSON text whatever the codec of the
+    events. A last line without newline, left by a write that did not
+    finish, is ignored.
+
+    :param filepath: Path of the file
+    :param event_cls: Class of event to parse, by default the JSON of the
+                      events is returned
+    """
+    with io.open(filepath, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            event_json = line[:-1].decode("utf-8")
+            if event_cls is None:
+                yield event_json
+            else:
+                yield event_cls.from_json(
+                    event_cls.codec.from_text(event_json)
+                )
 
 
 class LogConsumer(Consumer):
-    """Log to a file an event."""
+    """Log to a file an event.
+
+    The file is kept open and the events are written in groups, once
+    ``commit_events`` events are waiting or ``commit_interval`` seconds
+    after the first one. Each event is written in a line, so the file
+    can be read back with :func read_events:.
 
-    def __init__(self, filepath="events.log"):
-        """Initialise permissions and filepath."""
+    The file can be rotated once it reaches ``max_bytes`` or after
+    ``rotate_interval`` seconds: it is renamed with the time as suffix
+    and a new file is started. With rotation, every process writes its
+    own file, see :method path:. The groups which the timer fails to
+    write are logged.
+    """
+
+    def __init__(self, filepath="events.log", commit_events=100,
+                 commit_interval=0.05, fsync=FSYNC_NEVER, max_bytes=None,
+                 rotate_interval=None):
+        """Initialise permissions and filepath.
+
+        :param filepath: Path of the file, suffixed with the process id
+                         if the file is rotated
+        :param commit_events: Number of events written together, ``1`` to
+                              write every event as soon as it is consumed
+        :param commit_interval: Maximum seconds an event waits to be written
+        :param fsync: When the file is synced to disk, see ``FSYNC_*``
+        :param max_bytes: Size of the file that triggers a rotation
+        :param rotate_interval: Seconds after which the file is rotated
+        """
         self.filepath = filepath
-        # Permission to read, write and create
-        self.default_permissions = "a"
+        # Permission to append in binary, the events are encoded in UTF-8
+        self.default_permissions = "ab"
+        self.commit_events = commit_events
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+
+        self._init_state()
+
+    def _init_state(self):
+        self._lock = threading.RLock()
+        self._lines = []
+        self._timer = None
+        self._file = None
+        self._pid = None
+        self._size = 0
+        self._opened_at = None
+        close_at_exit(self)
+
+    def __getstate__(self):
+        """Pickle the consumer without its file, lock and waiting events.
+
+        It lets the consumer run in a process pool, where every copy
+        opens the file again.
+        """
+        state = self.__dict__.copy()
+        for name in ("_lock", "_lines", "_timer", "_file", "_pid", "_size",
+                     "_opened_at"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled consumer, without file nor waiting events."""
+        self.__dict__.update(state)
+        self._init_state()
 
     def write_event(self, event_json):
         """Choose the format of the event to be written."""
@@ -26,5 +124,116 @@ class LogConsumer(Consumer):
 
     def consume(self, event_json, *args, **kwargs):
         """Write event to file."""
-        with open(self.filepath, self.default_permissions) as f:
-            f.write(self.write_event(event_json))
+        self._add(event_json)
+
+    def consume_many(self, events_json, *args, **kwargs):
+        """Write a chunk of events at once."""
+        events_json = list(events_json)
+        with self.hooks(events_json, *args, **kwargs), self._lock:
+            for event_json in events_json:
+                self._lines.append(self._frame(event_json))
+            self.commit()
+
+    def commit(self):
+        """Write the waiting events to the file."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._lines:
+                return
+
+            lines, self._lines = self._lines, []
+            self._write(lines)
+
+            if self.max_bytes is not None and self._size >= self.max_bytes \
+                    or self.rotate_interval is not None and \
+                    time.time() - self._opened_at >= self.rotate_interval:
+                self.rotate()
+
+    def path(self):
+        """Get the path of the file written by this process.
+
+        Rotated files are written by a single process each, so the
+        process id is added to their path.
+        """
+        if self.max_bytes is None and self.rotate_interval is None:
+            return self.filepath
+        return "{0}.{1}".format(self.filepath, os.getpid())
+
+    def rotate(self):
+        """Rename the file with the time as suffix and start a new one."""
+        with self._lock:
+            self._close_file()
+            path = self.path()
+            if not os.path.exists(path):
+                return
+            rotated = "{0}.{1}".format(path, time.strftime("%Y%m%d-%H%M%S"))
+            suffix = 0
+            while os.path.exists(rotated):
+                suffix += 1
+                rotated = "{0}.{1}-{2}".format(
+                    path, time.strftime("%Y%m%d-%H%M%S"), suffix
+                )
+            os.rename(path, rotated)
+
+    def close(self):
+        """Write the waiting events and close the file."""
+        with self._lock:
+            self.commit()
+            self._close_file()
+
+    def _commit_waiting(self):
+        # Nobody gets the errors raised in the thread of the timer
+        try:
+            self.commit()
+        except Exception:
+            logger.exception("Writing a group of events to %s failed",
+                             self.path())
+
+    def _frame(self, event_json):
+        line = self.write_event(event_json)
+        if isinstance(line, bytes):
+            line = EventMixin.codec.to_text(line)
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        return u"{0}\n".format(line).encode("utf-8")
+
+    def _add(self, event_json):
+        with self._lock:
+            self._lines.append(self._frame(event_json))
+            if len(self._lines) >= self.commit_events:
+                self.commit()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.commit_interval,
+                                              self._commit_waiting)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _write(self, lines):
+        data = b"".join(lines)
+        f = self._open()
+        f.write(data)
+        f.flush()
+        if self.fsync == FSYNC_COMMIT:
+            os.fsync(f.fileno())
+        self._size += len(data)
+
+    def _open(self):
+        # A forked worker must not share the file of its parent
+        if self._file is None or self._pid != os.getpid():
+            self._file = io.open(self.path(), self.default_permissions)
+            self._pid = os.getpid()
+            self._size = self._file.seek(0, os.SEEK_END)
+            self._opened_at = time.time()
+        return self._file
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        if self._pid == os.getpid():
+            self._file.flush()
+            if self.fsync != FSYNC_NEVER:
+                os.fsync(self._file.fileno())
+            self._file.close()
+        self._file = None
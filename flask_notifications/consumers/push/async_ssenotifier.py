@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Notifier that uses Server-Sent Events from asyncio.
+
+It requires Python 3.6 or later.
+"""
+
+import asyncio
+
+from flask_notifications.consumers.push.ssenotifier import DISCONNECT, \
+    BaseSseNotifier
+
+
+class AsyncSseNotifier(BaseSseNotifier):
+    """Push the published messages in a channel to many SSE clients.
+
+    It is the counterpart of :class SseNotifier: for an
+    :class AsyncBackend:. A single task listens to the channel and copies
+    every message into the bounded queue of each client, so a client only
+    costs its queue and the coroutine serving it.
+
+    The notifier is also an ASGI application streaming the messages, which
+    replays the messages missed by clients sending a ``Last-Event-ID``.
+    It closes the streams when the server shuts down.
+    """
+
+    def __init__(self, backend, channel, *args, **kwargs):
+        """Initialise the notifier, see :class BaseSseNotifier:.
+
+        The channel is subscribed when the first client connects.
+        """
+        super(AsyncSseNotifier, self).__init__(
+            backend, channel, *args, **kwargs
+        )
+        self._tasks = ()
+
+    async def _listen(self):
+        try:
+            await self.backend.subscribe(self.channel)
+            async for message in self.backend.listen():
+                if message['type'] == 'message':
+                    self.publish(message['data'])
+        finally:
+            self.close()
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for queue in self.clients:
+                if queue.empty():
+                    # Heartbeat, as a comment ignored by the clients
+                    queue.put_nowait(b": \n\n")
+
+    def close(self):
+        """Stop listening to the channel and end the streams."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = ()
+        for queue in self.clients:
+            queue.put_nowait(None)
+        self.clients.clear()
+
+    def put(self, queue, frame):
+        """Copy a frame into the queue of a client, applying the policy.
+
+        The size of the queue is bounded here rather than by the queue,
+        to drop the oldest frame instead of waiting.
+        """
+        if queue.qsize() >= self.queue_size:
+            if self.policy == DISCONNECT:
+                self.clients.discard(queue)
+                queue.put_nowait(None)
+                return
+            queue.get_nowait()
+        queue.put_nowait(frame)
+
+    async def client(self, last_event_id=None):
+        """Yield the frames of a new client.
+
+        :param last_event_id: Id of the last message received by the client,
+                              given in the ``Last-Event-ID`` header
+        """
+        # The size of the queue is bounded when publishing
+        queue = asyncio.Queue()
+        for frame in self.replayed(last_event_id):
+            queue.put_nowait(frame)
+        self.clients.add(queue)
+        if not self._tasks:
+            self._tasks = (asyncio.ensure_future(self._listen()),
+                           asyncio.ensure_future(self._send_heartbeats()))
+        try:
+            yield self.retry_frame
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.clients.discard(queue)
+
+    async def __call__(self, scope, receive, send):
+        """Stream the messages to a client as an ASGI application.
+
+        Only the ``http`` and ``lifespan`` scopes are supported.
+        """
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise ValueError(
+                "Unsupported ASGI scope {0}".format(scope["type"])
+            )
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream"),
+                        (b"cache-control", b"no-cache")],
+        })
+
+        headers = dict(scope.get("headers", ()))
+        last_event_id = headers.get(b"last-event-id", b"").decode("latin-1")
+
+        async def stream():
+            async for frame in self.client(last_event_id):
+                await send({"type": "http.response.body", "body": frame,
+                            "more_body": True})
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        streaming = asyncio.ensure_future(stream())
+        waiting = asyncio.ensure_future(disconnected())
+        done, pending = await asyncio.wait(
+            (streaming, waiting), return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        if streaming in done:
+            await send({"type": "http.response.body", "body": b""})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 #
 # This file is part of Flask-Notifications
-# Copyright (C) 2015, 2016 CERN.
+# Copyright (C) 2015 CERN.
 #
 # Flask-Notifications is free software; you can redistribute it and/or modify
 # it under the terms of the Revised BSD License; see LICENSE file for
@@ -9,17 +9,116 @@
 
 """PushConsumer that push messages to a broker."""
 
-from flask_notifications.consumers.consumer import Consumer
+import logging
+import threading
+
+from flask_notifications.consumers.consumer import Consumer, close_at_exit
+
+logger = logging.getLogger(__name__)
+
+
+def _message(event_json):
+    if not isinstance(event_json, bytes):
+        event_json = str(event_json)
+    return event_json
 
 
 class PushConsumer(Consumer):
-    """Publish to a channel using a Backend without knowing the broker."""
+    """Publish to a channel using a Backend without knowing the broker.
 
-    def __init__(self, redis, hub_id):
-        """Initialise redis and the hub_id."""
+    Events can be published in micro-batches: they are buffered until
+    ``batch_size`` events are waiting or ``flush_interval`` seconds have
+    passed since the first one, and then published at once with
+    :method Backend.publish_many:. The waiting events are published when
+    the process exits, and the batches which the timer fails to publish
+    are logged.
+    """
+
+    def __init__(self, redis, hub_id, batch_size=1, flush_interval=0.01):
+        """Initialise redis and the hub_id.
+
+        :param redis: Backend used to publish the events
+        :param hub_id: Channel where the events are published
+        :param batch_size: Number of events published together, ``1`` to
+                           publish every event as soon as it is consumed
+        :param flush_interval: Maximum seconds an event waits in the batch
+        """
         self.redis = redis
         self.hub_id = hub_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._init_state()
+
+    def _init_state(self):
+        self._batch = []
+        self._lock = threading.Lock()
+        self._timer = None
+        close_at_exit(self)
+
+    def __getstate__(self):
+        """Pickle the consumer without its lock and waiting events.
+
+        The backend must be picklable too, to run in a process pool.
+        """
+        state = self.__dict__.copy()
+        for name in ("_batch", "_lock", "_timer"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled consumer, without waiting events."""
+        self.__dict__.update(state)
+        self._init_state()
 
     def consume(self, event_json, *args, **kwargs):
-        """Publish an event to a channel named with the hub_id."""
-        return self.redis.publish(self.hub_id, str(event_json))
+        """Publish an event to a channel named with the hub_id.
+
+        Return the result of the publication, or None if the event is
+        waiting in the batch.
+        """
+        if self.batch_size <= 1:
+            return self.redis.publish(self.hub_id, _message(event_json))
+
+        with self._lock:
+            self._batch.append(_message(event_json))
+            if len(self._batch) < self.batch_size:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval,
+                                                  self._flush_waiting)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return None
+        return self.flush()
+
+    def consume_many(self, events_json, *args, **kwargs):
+        """Publish a chunk of events at once, with the waiting ones."""
+        events_json = list(events_json)
+        with self.hooks(events_json, *args, **kwargs):
+            with self._lock:
+                self._batch.extend(_message(event_json)
+                                   for event_json in events_json)
+            return self.flush()
+
+    def flush(self):
+        """Publish the waiting events at once."""
+        with self._lock:
+            batch, self._batch = self._batch, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return []
+        return self.redis.publish_many(
+            (self.hub_id, event_json) for event_json in batch
+        )
+
+    def close(self):
+        """Publish the waiting events."""
+        self.flush()
+
+    def _flush_waiting(self):
+        # Nobody gets the errors raised in the thread of the timer
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Publishing a batch to %s failed", self.hub_id)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Buffer of the recent messages of a hub."""
+
+import uuid
+from collections import deque
+
+
+class ReplayBuffer(object):
+    """Bounded buffer of the recent frames of a hub, to replay them.
+
+    Every frame gets an id made of a token, unique to the buffer, and an
+    increasing sequence number. A client reconnecting with the id of the
+    last frame it received gets the frames sent after it, as long as they
+    are still in the buffer. Otherwise, it must reload its state, since
+    it missed some frames.
+    """
+
+    def __init__(self, max_events=100, max_bytes=1024 * 1024):
+        """Initialise an empty buffer.
+
+        :param max_events: Maximum number of frames kept
+        :param max_bytes: Maximum size of the frames kept
+        """
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.token = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._frames = deque()
+        self._bytes = 0
+
+    def __len__(self):
+        """Return the number of frames kept."""
+        return len(self._frames)
+
+    def next_id(self):
+        """Get the id of the next frame."""
+        self._sequence += 1
+        return "{0}-{1}".format(self.token, self._sequence)
+
+    def append(self, frame):
+        """Keep a frame with the last id, evicting the oldest frames."""
+        self._frames.append((self._sequence, frame))
+        self._bytes += len(frame)
+        while self._frames and (len(self._frames) > self.max_events or
+                                self._bytes > self.max_bytes):
+            self._bytes -= len(self._frames.popleft()[1])
+
+    def last_id(self):
+        """Get the id of the last frame, or None if there is none."""
+        if not self._sequence:
+            return None
+        return "{0}-{1}".format(self.token, self._sequence)
+
+    def since(self, last_event_id):
+        """Get the frames sent after the one with the given id.
+
+        :returns: The frames, or None if some of them are not in the
+                  buffer anymore, or if the id does not come from this
+                  buffer
+        """
+        token, _, sequence = (last_event_id or "").rpartition("-")
+        if token != self.token or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self._frames[0][0] if self._frames else self._sequence + 1
+        if sequence < oldest - 1:
+            return None
+        return [frame for frame_sequence, frame in self._frames
+                if frame_sequence > sequence]
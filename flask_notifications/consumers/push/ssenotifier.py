@@ -9,22 +9,231 @@
 
 """Notifier that uses Server-Sent Events."""
 
+import abc
+import threading
+import time
+from collections import deque
+
 from sse import Sse
 
+from flask_notifications.consumers.push.replay_buffer import ReplayBuffer
+
+#: Policies for clients that do not read their messages fast enough
+DROP_OLDEST = "drop-oldest"
+DISCONNECT = "disconnect"
+
+
+class BaseSseNotifier(object):
+    """Messages of a channel formatted and queued for many SSE clients.
+
+    The messages are formatted once as SSE frames and copied into the
+    queue of every client, whose type depends on the notifier. The recent
+    messages are kept in a :class ReplayBuffer:, so a client reconnecting
+    with the id of the last message it received gets the messages it
+    missed.
+    """
 
-class SseNotifier(object):
-    """Iterator that yields the published messages in a channel."""
+    __metaclass__ = abc.ABCMeta
 
-    def __init__(self, backend, channel):
-        """Initialise PublishSubscribe instance and channel."""
+    def __init__(self, backend, channel, codec=None, queue_size=100,
+                 policy=DROP_OLDEST, heartbeat=15, replay_events=100,
+                 replay_bytes=1024 * 1024):
+        """Initialise the backend and the channel.
+
+        :param codec: Codec of the published events, used to push them
+                      as JSON to the clients
+        :param queue_size: Maximum number of messages waiting for a client
+        :param policy: What to do when the queue of a client is full, either
+                       ``"drop-oldest"`` or ``"disconnect"``
+        :param heartbeat: Seconds without messages before sending a comment
+                          to the client, to detect disconnections
+        :param replay_events: Maximum number of messages kept to be replayed,
+                              ``0`` to disable the replay
+        :param replay_bytes: Maximum size of the messages kept to be replayed
+        """
         self.sse = Sse()
         self.backend = backend
+        self.channel = channel
+        self.codec = codec
+        self.queue_size = queue_size
+        self.policy = policy
+        self.heartbeat = heartbeat
+        self.replay = ReplayBuffer(replay_events, replay_bytes) \
+            if replay_events else None
+
+        # The first message of the Sse buffer sets the retry timeout
+        self.retry_frame = "".join(self.sse).encode('u8')
+
+        self.clients = set()
+
+    def format(self, data, event_id=None):
+        """Format a published message as a SSE frame."""
+        if self.codec is not None:
+            data = self.codec.to_text(data)
+        self.sse.add_message("", data)
+        frame = "".join(self.sse)
+        if event_id is not None:
+            frame = "id: {0}\n{1}".format(event_id, frame)
+        return frame.encode('u8')
+
+    def replayed(self, last_event_id):
+        """Get the frames published after the one with ``last_event_id``.
+
+        If some of them cannot be replayed, the client gets a ``reset``
+        event instead, telling it to reload its state.
+        """
+        if not last_event_id or self.replay is None:
+            return []
+        frames = self.replay.since(last_event_id)
+        if frames is not None:
+            return frames
+        self.sse.add_message("reset", "reload")
+        frame = "".join(self.sse)
+        last_id = self.replay.last_id()
+        if last_id is not None:
+            frame = "id: {0}\n{1}".format(last_id, frame)
+        return [frame.encode('u8')]
+
+    def publish(self, data):
+        """Format a message and copy it into the queue of every client."""
+        if self.replay is None:
+            frame = self.format(data)
+        else:
+            frame = self.format(data, self.replay.next_id())
+            self.replay.append(frame)
+
+        for client in list(self.clients):
+            self.put(client, frame)
+
+    @abc.abstractmethod
+    def put(self, client, frame):
+        """Copy a frame into the queue of a client."""
+
+
+class SseNotifier(BaseSseNotifier):
+    """Iterator that yields the published messages in a channel.
+
+    A notifier is the only subscriber to the channel in the process. Once a
+    client iterates over it, a background thread listens to the channel and
+    copies every message into the bounded queue of each client.
+    """
+
+    def __init__(self, backend, channel, *args, **kwargs):
+        """Subscribe to the channel, see :class BaseSseNotifier:."""
+        super(SseNotifier, self).__init__(backend, channel, *args, **kwargs)
         self.backend.subscribe(channel)
+        self._condition = threading.Condition()
+        self._thread = None
 
     def __iter__(self):
         """Yield the published messages in a SSE format."""
-        for message in self.backend.listen():
-            if message['type'] == 'message':
-                self.sse.add_message("", message['data'])
-                for data in self.sse:
-                    yield data.encode('u8')
+        return iter(self.client())
+
+    def client(self, queue_size=None, policy=None, last_event_id=None):
+        """Create a new client receiving the published messages.
+
+        :param last_event_id: Id of the last message received by the client,
+                              given in the ``Last-Event-ID`` header
+        """
+        return SseClient(self, queue_size or self.queue_size,
+                         policy or self.policy, last_event_id)
+
+    def add_client(self, client, last_event_id=None):
+        """Start copying the published messages to a client.
+
+        The messages sent after the one with ``last_event_id`` are replayed.
+        """
+        with self._condition:
+            client.queue.extend(self.replayed(last_event_id))
+            self.clients.add(client)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def remove_client(self, client):
+        """Stop copying the published messages to a client."""
+        with self._condition:
+            self.clients.discard(client)
+
+    def _listen(self):
+        try:
+            for message in self.backend.listen():
+                if message['type'] == 'message':
+                    self.publish(message['data'])
+        finally:
+            with self._condition:
+                self._thread = None
+                for client in self.clients:
+                    client.closed = True
+                self.clients.clear()
+                self._condition.notify_all()
+
+    def publish(self, data):
+        """Copy a message into the queue of every client and wake them up."""
+        with self._condition:
+            super(SseNotifier, self).publish(data)
+            self._condition.notify_all()
+
+    def put(self, client, frame):
+        """Copy a frame into the queue of a client, unless disconnected."""
+        if not client.put(frame):
+            self.clients.discard(client)
+
+
+class SseClient(object):
+    """Iterator over the messages of a :class SseNotifier: for one client."""
+
+    def __init__(self, notifier, queue_size, policy, last_event_id=None):
+        """Initialise an empty queue."""
+        self.notifier = notifier
+        self.queue_size = queue_size
+        self.policy = policy
+        self.last_event_id = last_event_id
+        self.queue = deque()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, frame):
+        """Queue a frame, returning whether the client is still connected.
+
+        It must be called holding the lock of the notifier.
+        """
+        if len(self.queue) >= self.queue_size:
+            if self.policy == DISCONNECT:
+                self.closed = True
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(frame)
+        return True
+
+    def __iter__(self):
+        """Yield the frames queued for this client."""
+        notifier = self.notifier
+        condition = notifier._condition
+        notifier.add_client(self, self.last_event_id)
+        try:
+            yield notifier.retry_frame
+            while True:
+                with condition:
+                    deadline = time.time() + notifier.heartbeat
+                    while not self.queue and not self.closed:
+                        timeout = deadline - time.time()
+                        if timeout <= 0:
+                            break
+                        condition.wait(timeout)
+                    frames = list(self.queue)
+                    self.queue.clear()
+                    closed = self.closed
+
+                if frames:
+                    for frame in frames:
+                        yield frame
+                elif closed:
+                    return
+                else:
+                    # Heartbeat, as a comment ignored by the clients
+                    yield b": \n\n"
+        finally:
+            notifier.remove_client(self)
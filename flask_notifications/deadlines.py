@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Expiration datetimes of the events, naive or timezone-aware."""
+
+import time
+
+from flask_notifications.codecs.codec import to_timestamp
+
+
+def expired(deadline, now=None, delay=0):
+    """Check whether a datetime has passed, or will within some seconds.
+
+    :param deadline: Naive local or timezone-aware datetime, never passed
+                     if None
+    :param now: Current timestamp, by default the time of the system
+    :param delay: Seconds from now
+    """
+    if deadline is None:
+        return False
+    now = time.time() if now is None else now
+    return to_timestamp(deadline) <= now + delay
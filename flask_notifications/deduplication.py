@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Deduplication of the events sent again within a time window."""
+
+import threading
+import time
+
+from flask_notifications.lru import LRUDict
+
+
+class LocalSeenIds(object):
+    """Event ids seen by the process within a time window.
+
+    The least recently seen ids are forgotten beyond ``max_size``, so the
+    memory used is bounded whatever the number of events.
+    """
+
+    def __init__(self, ttl, max_size=10000):
+        """Initialise the ids seen.
+
+        :param ttl: Seconds an id is remembered
+        :param max_size: Maximum number of ids remembered
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ids = LRUDict(max_size)
+
+    def add(self, event_id, now=None):
+        """Remember an id, returning whether it was not seen already."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expiration = self._ids.get(event_id)
+            if expiration is not None and expiration > now:
+                return False
+            self._ids[event_id] = now + self.ttl
+            return True
+
+    def discard(self, event_id):
+        """Forget an id, so it is not a duplicate anymore."""
+        with self._lock:
+            self._ids.discard(event_id)
+
+
+class RedisSeenIds(object):
+    """Event ids seen by every process within a time window, in Redis.
+
+    Every id is a key set only if it does not exist, expiring after the
+    window.
+    """
+
+    def __init__(self, redis, ttl, prefix="flask-notifications:seen:"):
+        """Initialise the ids seen.
+
+        :param redis: :class redis.StrictRedis: connection
+        :param ttl: Seconds an id is remembered
+        :param prefix: Prefix of the keys of the ids in Redis
+        """
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def add_many(self, event_ids):
+        """Remember ids, returning whether each of them was not seen."""
+        if not event_ids:
+            return []
+        pipeline = self.redis.pipeline(transaction=False)
+        for event_id in event_ids:
+            pipeline.set(self.prefix + event_id, 1, nx=True,
+                         px=int(self.ttl * 1000))
+        return [bool(result) for result in pipeline.execute()]
+
+    def discard_many(self, event_ids):
+        """Forget ids, so they are not duplicates anymore."""
+        if event_ids:
+            self.redis.delete(*[self.prefix + event_id
+                                for event_id in event_ids])
+
+
+class Deduplicator(object):
+    """Detect the events whose id was already sent within a time window.
+
+    The ids are looked up in the process first, then in Redis if given,
+    which is shared by every process sending events. A single round trip
+    checks a whole batch of events. The events which could not be sent
+    must be forgotten, so that they are not duplicates when retried.
+    """
+
+    def __init__(self, ttl, max_size=10000, redis=None):
+        """Initialise the ids seen.
+
+        :param ttl: Seconds an id is remembered
+        :param max_size: Maximum number of ids remembered by the process
+        :param redis: :class redis.StrictRedis: connection to share the ids
+                      seen, only remembered by the process if None
+        """
+        self.local = LocalSeenIds(ttl, max_size)
+        self.shared = RedisSeenIds(redis, ttl) if redis is not None \
+            else None
+
+    def first_seen(self, events):
+        """Check whether each event is seen for the first time."""
+        now = time.time()
+        seen = [self.local.add(event["event_id"], now) for event in events]
+        if self.shared is not None:
+            shared = iter(self.shared.add_many(
+                [event["event_id"] for event, new in zip(events, seen) if new]
+            ))
+            seen = [new and next(shared) for new in seen]
+        return seen
+
+    def unique(self, events):
+        """Get the events seen for the first time."""
+        return [event for event, new in zip(events, self.first_seen(events))
+                if new]
+
+    def forget(self, events):
+        """Forget the ids of events, so they can be sent again."""
+        event_ids = [event["event_id"] for event in events]
+        for event_id in event_ids:
+            self.local.discard(event_id)
+        if self.shared is not None:
+            self.shared.discard_many(event_ids)
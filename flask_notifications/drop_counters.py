@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""DropCounters declaration."""
+
+import threading
+
+
+class DropCounters(object):
+    """Thread-safe counts of the events dropped, per stage.
+
+    The stages are ``"send"``, for the events expired when they are sent,
+    ``"duplicate"``, for the events already sent, ``"rate-limit"``, for
+    the events over the rate limit of a consumer, and the name of each
+    executor, for the events expired when they were about to be consumed.
+    """
+
+    def __init__(self):
+        """Initialise the counters without drops."""
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def __getitem__(self, stage):
+        """Get the number of events dropped by a stage."""
+        return self._counts.get(stage, 0)
+
+    def increment(self, stage, count=1):
+        """Count events dropped by a stage."""
+        with self._lock:
+            self._counts[stage] = self._counts.get(stage, 0) + count
+
+    def snapshot(self):
+        """Get a dictionary with the counts of every stage."""
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        """Forget every drop counted so far."""
+        with self._lock:
+            self._counts = {}
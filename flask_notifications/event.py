@@ -9,22 +9,56 @@
 
 """Event declaration for the Flask-Notifications module."""
 
+import abc
 import uuid
 import time
 import datetime
+import numbers
+from contextlib import contextmanager
 
-from jsonschema import Draft4Validator, FormatChecker
+from jsonschema import Draft4Validator, FormatChecker, ValidationError
+from six import integer_types, string_types
 from six.moves import UserDict
-from flask.json import loads, dumps
 
+from flask_notifications.codecs.flask_json_codec import FlaskJSONCodec
+from flask_notifications.deadlines import expired
 
-class Event(UserDict):
-    """Event is a signal which models a type of notification.
+# Python types of the JSON types used in the schemas
+json_types = {
+    "array": (list,),
+    "boolean": (bool,),
+    "integer": integer_types,
+    "null": (type(None),),
+    "number": (numbers.Number,),
+    "object": (dict,),
+    "string": string_types,
+}
 
-    It's fully customizable and allow to represent the business model
-    by extending it.
+# Validators and type checks per class, with the schema they were built for
+_validators = {}
+
+# Payload of an event whose serialization is memoized but not yet done
+_not_serialized = object()
+
+
+class EventMixin(object):
+    """Schema, validation and serialization shared by the event types.
+
+    Events are validated against the schema of their class when they are
+    created. The validator is built once per class and built again only if
+    the ``schema`` attribute is replaced. Setting ``validation`` to
+    ``"fast"`` only checks that the required fields exist and that the
+    fields have the right types.
+
+    The ``codec`` serializes the events in :method to_json: and
+    :method from_json:.
     """
 
+    __metaclass__ = abc.ABCMeta
+    __slots__ = ()
+
+    codec = FlaskJSONCodec()
+
     schema = {
         "$schema": "http://json-schema.org/schema#",
         "type": "object",
@@ -40,6 +74,7 @@ class Event(UserDict):
             "expiration_datetime": {
                 "type": ["datetime", "null"],
             },
+            "priority": {"type": ["string", "null"]},
         },
         "required": [
             "event_id", "event_type", "title",
@@ -48,6 +83,156 @@ class Event(UserDict):
         ],
     }
 
+    validation = "full"
+
+    # Python types of the custom JSON types of the schema
+    schema_types = {"datetime": datetime.datetime}
+
+    def __str__(self):
+        """By default, JSON."""
+        return self.to_json()
+
+    def is_expired(self, now=None):
+        """Check whether the expiration datetime of the event has passed.
+
+        :param now: Current timestamp, by default the time of the system
+        """
+        return expired(self.get("expiration_datetime"), now)
+
+    @classmethod
+    def _compiled_schema(cls):
+        """Get the validator, type checks and datetime fields of the schema."""
+        try:
+            schema, validator, type_checks, datetime_fields = _validators[cls]
+        except KeyError:
+            schema = None
+
+        if schema is not cls.schema:
+            validator = Draft4Validator(cls.schema,
+                                        types=cls.schema_types,
+                                        format_checker=FormatChecker())
+            types = dict(json_types)
+            for name, python_types in cls.schema_types.items():
+                types[name] = python_types if isinstance(python_types, tuple) \
+                    else (python_types,)
+
+            type_checks = []
+            datetime_fields = []
+            for field, spec in cls.schema.get("properties", {}).items():
+                field_types = spec.get("type", ())
+                if isinstance(field_types, string_types):
+                    field_types = [field_types]
+                if "datetime" in field_types:
+                    datetime_fields.append(field)
+                type_checks.append((
+                    field,
+                    tuple(t for name in field_types
+                          for t in types.get(name, ())),
+                    "boolean" not in field_types,
+                ))
+            _validators[cls] = (cls.schema, validator, type_checks,
+                                datetime_fields)
+        return validator, type_checks, datetime_fields
+
+    @classmethod
+    def validator(cls):
+        """Get the JSON-schema validator of the class schema."""
+        return cls._compiled_schema()[0]
+
+    @classmethod
+    def datetime_fields(cls):
+        """Get the fields of the class schema holding datetimes."""
+        return cls._compiled_schema()[2]
+
+    def validate(self, validation=None):
+        """Validate the event, raising :class ValidationError: if invalid.
+
+        :param validation: Either ``"full"`` or ``"fast"``, by default
+                           the ``validation`` of the class
+        """
+        validator, type_checks, _ = self._compiled_schema()
+        # The data of some event types is built on every access
+        data = self.data
+        if (validation or self.validation) != "fast":
+            return validator.validate(data)
+
+        for field in self.schema.get("required", ()):
+            if field not in data:
+                raise ValidationError(
+                    "{0!r} is a required property".format(field)
+                )
+        for field, field_types, no_booleans in type_checks:
+            if field not in data or not field_types:
+                continue
+            value = data[field]
+            if (not isinstance(value, field_types) or
+                    (no_booleans and isinstance(value, bool))):
+                raise ValidationError(
+                    "{0!r} is not of the type of {1!r}".format(value, field)
+                )
+
+    @staticmethod
+    def to_datetime(dt_format):
+        """Get datetime from default string format.
+
+        If you use your own format for the datetime, override this method
+        to match your datetimes. Otherwise, they won't be validated.
+        """
+        datetime_format = "%a, %d %b %Y %H:%M:%S GMT"
+        return datetime.datetime.strptime(dt_format, datetime_format)
+
+    @classmethod
+    def from_json(cls, event_json, trusted=False):
+        """Json to event.
+
+        :param trusted: Skip the validation of the event. Only use it for
+                        events produced by this application, e.g. when
+                        decoding them in the workers
+        """
+        d = cls.codec.decode(event_json, cls)
+        if trusted:
+            return cls.trusted(d)
+        return cls(**d)
+
+    @classmethod
+    @abc.abstractmethod
+    def trusted(cls, d):
+        """Create an event from a dictionary without validating it."""
+
+    def to_json(self):
+        """Event to json, or to the format of the codec."""
+        payload = getattr(self, "_payload", None)
+        if payload is None:
+            return self.codec.encode(self)
+        if payload is _not_serialized:
+            payload = self._payload = self.codec.encode(self)
+        return payload
+
+    @contextmanager
+    def serialized_once(self):
+        """Serialize the event at most once inside the context.
+
+        Every call to :method to_json: returns the same payload, so the
+        event must not be modified inside the context.
+        """
+        if getattr(self, "_payload", None) is not None:
+            yield self
+            return
+
+        self._payload = _not_serialized
+        try:
+            yield self
+        finally:
+            self._payload = None
+
+
+class Event(EventMixin, UserDict):
+    """Event is a signal which models a type of notification.
+
+    It's fully customizable and allow to represent the business model
+    by extending it.
+    """
+
     def __init__(self, event_id, event_type, title, body,
                  timestamp=None, sender="", recipients=[],
                  tags=[], expiration_datetime=None, **kwargs):
@@ -68,37 +253,12 @@ class Event(UserDict):
              "tags": tags,
              "expiration_datetime": expiration_datetime}
 
-        UserDict.__init__(self, dict=d, **kwargs)
-
-        validator = Draft4Validator(Event.schema,
-                                    types={"datetime": (datetime.datetime)},
-                                    format_checker=FormatChecker())
-        validator.validate(self.data)
-
-    def __str__(self):
-        """By default, JSON."""
-        return self.to_json()
-
-    @staticmethod
-    def to_datetime(dt_format):
-        """Get datetime from default string format.
-
-        If you use your own format for the datetime, override this method
-        to match your datetimes. Otherwise, they won't be validated.
-        """
-        datetime_format = "%a, %d %b %Y %H:%M:%S GMT"
-        return datetime.datetime.strptime(dt_format, datetime_format)
+        UserDict.__init__(self, d, **kwargs)
+        self.validate()
 
     @classmethod
-    def from_json(cls, event_json):
-        """Json to event."""
-        d = loads(event_json)
-        expiration = d["expiration_datetime"]
-        if expiration:
-            # By default, datetime are not decoded correctly
-            d["expiration_datetime"] = cls.to_datetime(expiration)
-        return cls(**d)
-
-    def to_json(self):
-        """Event to json."""
-        return dumps(self.data)
+    def trusted(cls, d):
+        """Create an event from a dictionary without validating it."""
+        event = cls.__new__(cls)
+        UserDict.__init__(event, d)
+        return event
@@ -11,6 +11,8 @@
 
 from abc import ABCMeta, abstractmethod
 
+from six import get_unbound_function
+
 
 class EventFilter(object):
     """Filter that represents a certain condition for the events.
@@ -19,6 +21,9 @@ class EventFilter(object):
         :method &: AND bitwise operator
         :method |: OR bitwise operator
         :method ^: XOR bitwise operator
+
+    A filter, however deeply composed, can be turned into a single flat
+    predicate with :method compile:.
     """
 
     __metaclass__ = ABCMeta
@@ -44,37 +49,152 @@ class EventFilter(object):
         """Compose filters with ^."""
         return XorFilter(self, other)
 
+    def expression(self, bind):
+        """Return a Python expression over ``event`` equivalent to the filter.
+
+        :param bind: Callable that stores a value in the namespace of the
+                     compiled predicate and returns the name bound to it
+
+        By default, the expression calls the filter itself. Override it
+        in filters whose logic can be inlined to avoid that call.
+        """
+        if (get_unbound_function(type(self).__call__) is
+                get_unbound_function(EventFilter.__call__)):
+            return "{0}(event)".format(bind(self.filter))
+        return "{0}(event)".format(bind(self))
+
+    def _inlines(self, cls):
+        """Check whether the filter runs the logic of ``cls`` unchanged.
+
+        The expression and index terms of ``cls`` only hold for the
+        subclasses which do not override :method filter: nor
+        :method __call__:.
+        """
+        return (get_unbound_function(type(self).filter) is
+                get_unbound_function(cls.filter) and
+                get_unbound_function(type(self).__call__) is
+                get_unbound_function(EventFilter.__call__))
+
+    def index_terms(self):
+        """Return the terms that any event matching the filter must have.
+
+        A term is a ``(field, value)`` pair, and an event matching the
+        filter has at least one of them. ``None`` means that the filter
+        cannot be indexed, which is the default.
+        """
+        return None
+
+    def compile(self):
+        """Compile the filter tree into a single flat predicate.
+
+        The returned callable takes an event and short-circuits like
+        the composed filters do, but without a call per node. The values
+        of the filters are bound at compilation time, so compile again
+        after modifying any filter of the tree. Trees too deep for the
+        Python compiler fall back to calling the filter itself.
+        """
+        namespace = {}
+
+        def bind(value):
+            name = "_v{0}".format(len(namespace))
+            namespace[name] = value
+            return name
+
+        try:
+            source = "lambda event: {0}".format(self.expression(bind))
+            predicate = eval(source, namespace)
+        except (SyntaxError, RuntimeError, MemoryError):
+            # RecursionError is a RuntimeError
+            source = None
+
+            def predicate(event):
+                return self(event)
+        predicate.source = source
+        return predicate
+
 
 class ComposedFilter(EventFilter):
     """Interface for operators between filters."""
 
+    operator = None
+
     def __init__(self, one, other):
         """Initialise both filters."""
         self.one = one
         self.other = other
 
+    def operands(self):
+        """Get the filters joined by the operator, flattening the chains.
+
+        The operators are associative, so ``(a & b) & c`` gives
+        ``[a, b, c]``, which is compiled without nesting.
+        """
+        operands = []
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            if type(node) is type(self):
+                pending.extend((node.other, node.one))
+            else:
+                operands.append(node)
+        return operands
+
+    def expression(self, bind):
+        """Join the expressions of all the operands with the operator."""
+        if not any(self._inlines(cls)
+                   for cls in (AndFilter, OrFilter, XorFilter)):
+            return super(ComposedFilter, self).expression(bind)
+        separator = " {0} ".format(self.operator)
+        return "({0})".format(separator.join(
+            operand.expression(bind) for operand in self.operands()
+        ))
+
 
 class AndFilter(ComposedFilter):
     """Filter implementing the AND logic between two filters."""
 
+    operator = "and"
+
     def filter(self, event, *args, **kwargs):
         """AND logic."""
         return (self.one.__call__(event, args, kwargs) and
                 self.other.__call__(event, args, kwargs))
 
+    def index_terms(self):
+        """Use the most selective of both filters."""
+        if not self._inlines(AndFilter):
+            return None
+        candidates = [terms for terms in (self.one.index_terms(),
+                                          self.other.index_terms())
+                      if terms is not None]
+        return min(candidates, key=len) if candidates else None
+
 
 class OrFilter(ComposedFilter):
     """Filter implementing the OR logic between two filters."""
 
+    operator = "or"
+
     def filter(self, event, *args, **kwargs):
         """OR logic."""
         return (self.one.__call__(event, args, kwargs) or
                 self.other.__call__(event, args, kwargs))
 
+    def index_terms(self):
+        """Require both filters to be indexed."""
+        if not self._inlines(OrFilter):
+            return None
+        one, other = self.one.index_terms(), self.other.index_terms()
+        if one is None or other is None:
+            return None
+        return one + other
+
 
 class XorFilter(ComposedFilter):
     """Filter implementing the XOR logic between two filters."""
 
+    operator = "^"
+
     def filter(self, event, *args, **kwargs):
         """XOR logic."""
         return (self.one.__call__(event, args, kwargs) ^
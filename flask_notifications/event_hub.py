@@ -9,51 +9,194 @@
 
 """EventHub declaration."""
 
+import logging
+import pickle
+import threading
+import time
+from functools import partial
+
 from six import callable
-from blinker import signal
+from blinker import signal, Signal
 from six import wraps
 
+from flask_notifications.codecs.codec import to_timestamp
+from flask_notifications.deadlines import expired
+from flask_notifications.drop_counters import DropCounters
+from flask_notifications.executors import CELERY, PROCESS_POOL, \
+    Scheduler, consume_installed, consume_many, consume_many_installed, \
+    create_executor
 from flask_notifications.filters.always import Always
+from flask_notifications.priorities import PriorityLanes
+
+#: Every consumer of the hub gets its own task for each event
+CONSUMER_DISPATCH = "consumer"
+#: A single task for each event runs all the Celery consumers of the hub
+HUB_DISPATCH = "hub"
+
+#: Stage of the events dropped by the rate limits in the counters
+RATE_LIMIT = "rate-limit"
+
+logger = logging.getLogger(__name__)
+
+
+def _max_expiration(events):
+    expirations = [event["expiration_datetime"] for event in events]
+    return None if None in expirations else max(expirations, key=to_timestamp)
+
+
+def task_options(event, **options):
+    """Get the options of a task sending events serialized by the codec."""
+    if event.codec.name is not None:
+        options["serializer"] = event.codec.name
+    return options
+
+
+def _task_receivers(task, many_task, hub):
+    """Create the receivers applying the tasks of the events.
+
+    The tasks go to the queue and have the broker priority of the lane of
+    the events in the hub, the most urgent one for a chunk.
+    """
+    def apply_with_expiration_check(event, countdown=None):
+        options = hub.lanes.task_options(hub.lane(event))
+        return task.apply_async(
+            (event.to_json(),),
+            **task_options(event, expires=event["expiration_datetime"],
+                           countdown=countdown, **options)
+        )
+
+    def apply_many_with_expiration_check(events, payloads, countdown=None):
+        options = hub.lanes.task_options(hub.most_urgent_lane(events))
+        return many_task.apply_async(
+            (payloads,),
+            **task_options(events[0], expires=_max_expiration(events),
+                           countdown=countdown, **options)
+        )
+
+    return apply_with_expiration_check, apply_many_with_expiration_check
 
 
 class EventHub:
     """An EventHub is composed of a filter and consumers."""
 
-    def __init__(self, hub_alias, celery):
-        """Init the Hub with a hub alias and a Celery instance."""
+    def __init__(self, hub_alias, celery, max_workers=4, max_pending=1000,
+                 dispatch=CONSUMER_DISPATCH, dropped=None, priority=None,
+                 lanes=None):
+        """Init the Hub with a hub alias and a Celery instance.
+
+        :param dispatch: :data CONSUMER_DISPATCH: or :data HUB_DISPATCH:, to
+                         send each event in a single task to the workers,
+                         which run every Celery consumer of the hub
+        :param max_workers: Number of threads or processes of each pool
+                            running consumers in this process
+        :param max_pending: Maximum number of consumers waiting or running
+                            in each pool
+        :param dropped: :class DropCounters: of the events expired before
+                        being consumed in this process
+        :param priority: Lane of the events of the hub without priority
+                         of their own, see :mod flask_notifications.priorities:
+        :param lanes: :class PriorityLanes: mapping the lanes to Celery
+                      queues, broker priorities and weights in the pools
+        """
         self.hub_id = "event-hub-{0}".format(hub_alias)
         self.signal = signal(self.hub_id)
+        self.many_signal = signal("{0}-many".format(self.hub_id))
+
+        # Sent with the hub every time its filter changes
+        self.filter_changed = Signal()
 
         self._hub_event_filter = Always()
+        self._hub_predicate = self._hub_event_filter.compile()
         self.celery = celery
 
         # To confirm registration, async consumer != consumer
         self.registered_consumers = {}
+        self._receivers = {}
 
-    def register_consumer(self, f=None, **kwargs):
+        # Executors other than Celery, shared by the consumers of the hub
+        self._process_consumers = {}
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executors = {}
+        self._executors_lock = threading.Lock()
+        self.dropped = dropped if dropped is not None else DropCounters()
+        self._scheduler = None
+
+        self.priority = priority
+        self.lanes = lanes if lanes is not None else PriorityLanes()
+
+        # Consumers run by the tasks of the hub, with HUB_DISPATCH
+        self.dispatch = dispatch
+        self._hub_consumers = []
+        self._hub_tasks = None
+
+    def register_consumer(self, f=None, executor=CELERY, rate_limit=None,
+                          **kwargs):
         """Register a function making it asynchronous.
 
         The consumer is converted to async using the task decorator
         with the weak option enabled because the function is created in scope.
+        A second task, named after the first one with a ``.many`` suffix,
+        consumes chunks of events sent by :method consume_many:.
+
+        :param executor: Where the consumer runs, see
+                         :mod flask_notifications.executors:. Cheap
+                         consumers can skip Celery and run inline or in
+                         the pools of the hub, in the sending process.
+                         The consumers of a process pool must be
+                         picklable and have a unique ``name`` in the
+                         hub, otherwise :class ValueError: is raised.
+                         They are installed once in every worker
+                         process, and the pool is started again when
+                         one is added.
+        :param rate_limit: :class RateLimit: of the events sent to the
+                           consumer, checked before sending them. The
+                           deferred events wait as Celery countdowns or
+                           in a timer of the hub, not in a worker. The
+                           Celery consumers with a limit get their own
+                           tasks even with :data HUB_DISPATCH:.
+        :param kwargs: Options of the Celery task of the consumer. With
+                       :data HUB_DISPATCH:, the consumer runs in the task
+                       of the hub, so only ``name`` is allowed and
+                       :class ValueError: is raised for the others.
         """
         def register_async_consumer(f):
-            @wraps(f)
-            def make_async():
-                maker = self.celery.task(**kwargs)
-                return maker(f)
-
-            async_f = make_async()
-
-            def apply_with_expiration_check(event):
-                print(str(event["expiration_datetime"]))
-                return async_f.apply_async(
-                    (event.to_json(),),
-                    expires=event["expiration_datetime"]
+            if self.is_registered(f):
+                return f
+            name = kwargs.get("name") or \
+                "{0}.{1}".format(f.__module__, f.__name__)
+            if executor == PROCESS_POOL:
+                self._install(name, f)
+            if executor == CELERY and self.dispatch == HUB_DISPATCH and \
+                    rate_limit is None:
+                options = sorted(set(kwargs) - set(["name"]))
+                if options:
+                    raise ValueError(
+                        "Consumer {0} runs in the task of hub {1}, it cannot "
+                        "have the task options {2}".format(
+                            name, self.hub_id, ", ".join(options))
+                    )
+                self._hub_consumers.append((name, f))
+                self.registered_consumers[f] = self._connect_hub_tasks()
+                self._receivers[f] = None
+                return f
+
+            if executor == CELERY:
+                async_f, receivers = self._celery_receivers(f, **kwargs)
+                defer = self._countdown
+            else:
+                async_f, receivers = self._executor_receivers(f, executor,
+                                                              name)
+                defer = self._call_later
+            if rate_limit is not None:
+                receivers = self._rate_limited_receivers(
+                    receivers, rate_limit, name, defer
                 )
 
-            if not self.is_registered(f):
-                self.signal.connect(apply_with_expiration_check, weak=False)
-                self.registered_consumers[f] = async_f
+            self.signal.connect(receivers[0], weak=False)
+            self.many_signal.connect(receivers[1], weak=False)
+            self.registered_consumers[f] = async_f
+            self._receivers[f] = receivers
             return f
 
         if f and callable(f):
@@ -61,24 +204,247 @@ class EventHub:
         else:
             return register_async_consumer
 
+    def _celery_receivers(self, f, **kwargs):
+        @wraps(f)
+        def make_async():
+            maker = self.celery.task(**kwargs)
+            return maker(f)
+
+        async_f = make_async()
+
+        def consume_chunk(events_json):
+            return consume_many(f, events_json)
+
+        task_name = kwargs.get("name") or \
+            "{0}.{1}".format(f.__module__, f.__name__)
+        many_kwargs = dict(kwargs, name="{0}.many".format(task_name))
+        async_many_f = self.celery.task(**many_kwargs)(consume_chunk)
+
+        return async_f, _task_receivers(async_f, async_many_f, self)
+
+    def _connect_hub_tasks(self):
+        if self._hub_tasks is None:
+            name = "flask_notifications.{0}".format(self.hub_id)
+
+            def dispatch(event_json):
+                return self.run_consumers(event_json)
+
+            def dispatch_many(events_json):
+                return self.run_consumers(events_json, many=True)
+
+            task = self.celery.task(name=name)(dispatch)
+            many_task = self.celery.task(name="{0}.many".format(name))(
+                dispatch_many
+            )
+            receivers = _task_receivers(task, many_task, self)
+            self.signal.connect(receivers[0], weak=False)
+            self.many_signal.connect(receivers[1], weak=False)
+            self._hub_tasks = (task, receivers)
+        return self._hub_tasks[0]
+
+    def run_consumers(self, payload, many=False):
+        """Run every consumer dispatched by the tasks of the hub.
+
+        A failing consumer is logged and does not stop the others.
+
+        :param payload: Serialized event, or list of them if ``many``
+        :returns: The seconds taken by each consumer, by name, or None for
+                  the consumers that failed
+        """
+        timings = {}
+        for name, f in list(self._hub_consumers):
+            start = time.time()
+            try:
+                if many:
+                    consume_many(f, payload)
+                else:
+                    f(payload)
+            except Exception:
+                logger.exception("Consumer %s of %s failed", name,
+                                 self.hub_id)
+                timings[name] = None
+            else:
+                timings[name] = time.time() - start
+        return timings
+
+    def _install(self, name, f):
+        if name in self._process_consumers:
+            raise ValueError(
+                "Consumer {0} cannot run in a process pool, another "
+                "consumer of hub {1} has that name".format(name, self.hub_id)
+            )
+        try:
+            pickle.dumps(f)
+        except Exception as error:
+            raise ValueError(
+                "Consumer {0} cannot run in a process pool, it cannot be "
+                "pickled: {1}".format(name, error)
+            )
+        self._process_consumers[name] = f
+
+        # The running workers do not have the new consumer
+        with self._executors_lock:
+            pool = self._executors.pop(PROCESS_POOL, None)
+        if pool is not None:
+            pool.shutdown()
+
+    def _executor_receivers(self, f, executor, name):
+        # Only the name of the consumers of a process pool is sent
+        if executor == PROCESS_POOL:
+            consume = partial(consume_installed, name)
+            consume_chunk = partial(consume_many_installed, name)
+        else:
+            consume, consume_chunk = f, partial(consume_many, f)
+
+        # The executor is looked up every time, the pools may be shut down
+        def apply_with_expiration_check(event):
+            return self.executor(executor).submit(
+                event["expiration_datetime"], consume, event.to_json(),
+                lane=self.lane(event)
+            )
+
+        def apply_many_with_expiration_check(events, payloads):
+            return self.executor(executor).submit(
+                _max_expiration(events), consume_chunk, payloads,
+                lane=self.most_urgent_lane(events)
+            )
+
+        return executor, (apply_with_expiration_check,
+                          apply_many_with_expiration_check)
+
+    def _rate_limited_receivers(self, receivers, rate_limit, name, defer):
+        apply, apply_many = receivers
+
+        def apply_within_rate_limit(event):
+            delay = self._rate_limit_delay(rate_limit, event, name)
+            if not delay:
+                return None if delay is None else apply(event)
+            return defer(delay, apply, event)
+
+        def apply_many_within_rate_limit(events, payloads):
+            now, later, delay = ([], []), ([], []), 0
+            for event, payload in zip(events, payloads):
+                event_delay = self._rate_limit_delay(rate_limit, event, name)
+                if event_delay is None:
+                    continue
+                chunk = later if event_delay else now
+                chunk[0].append(event)
+                chunk[1].append(payload)
+                delay = max(delay, event_delay)
+            if now[0]:
+                apply_many(*now)
+            if later[0]:
+                defer(delay, apply_many, *later)
+
+        return apply_within_rate_limit, apply_many_within_rate_limit
+
+    def _rate_limit_delay(self, rate_limit, event, name):
+        delay = rate_limit.delay(event, name)
+        expiration = event["expiration_datetime"]
+        if delay and expired(expiration, delay=delay):
+            delay = None
+        if delay is None:
+            self.dropped.increment(RATE_LIMIT)
+        return delay
+
+    def _countdown(self, delay, apply, *args):
+        return apply(*args, countdown=delay)
+
+    def _call_later(self, delay, apply, *args):
+        with self._executors_lock:
+            if self._scheduler is None:
+                self._scheduler = Scheduler()
+        self._scheduler.call_later(delay, apply, *args)
+
+    def executor(self, name):
+        """Get the executor of the hub with a name, creating it if needed."""
+        with self._executors_lock:
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = create_executor(name, self.max_workers,
+                                           self.max_pending, self.dropped,
+                                           self.lanes.weights,
+                                           dict(self._process_consumers))
+                self._executors[name] = executor
+            return executor
+
+    def lane(self, event):
+        """Get the priority lane of an event in the hub."""
+        return self.lanes.lane(event, self.priority)
+
+    def most_urgent_lane(self, events):
+        """Get the most urgent priority lane of a chunk of events."""
+        return self.lanes.most_urgent([self.lane(event) for event in events])
+
+    def shutdown(self, wait=True):
+        """Release the pools of the hub, created again when needed."""
+        with self._executors_lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait)
+
     def is_registered(self, consumer_or_name):
         """Check if a consumer is registered."""
         return consumer_or_name in self.registered_consumers
 
     def deregister_consumer(self, consumer):
         """Deregister one or more consumers."""
-        async_consumer = self.registered_consumers[consumer]
-        self.signal.disconnect(async_consumer)
+        receivers = self._receivers.pop(consumer)
+        if receivers is None:
+            self._hub_consumers = [(name, f) for name, f
+                                   in self._hub_consumers if f != consumer]
+            if not self._hub_consumers and self._hub_tasks is not None:
+                receivers = self._hub_tasks[1]
+                self._hub_tasks = None
+        if receivers is not None:
+            self.signal.disconnect(receivers[0])
+            self.many_signal.disconnect(receivers[1])
         try:
             del self.registered_consumers[consumer]
         except KeyError:
             pass
+        self._process_consumers = dict(
+            (name, f) for name, f in self._process_consumers.items()
+            if f is not consumer
+        )
 
     def filter_by(self, event_filter):
-        """Filter the events to know if the event should be processed."""
+        """Filter the events to know if the event should be processed.
+
+        The filter is compiled into a flat predicate, so call this method
+        again if the filter is modified afterwards.
+        """
         self._hub_event_filter = event_filter
+        self._hub_predicate = event_filter.compile()
+        self.filter_changed.send(self)
+
+    def matches(self, event):
+        """Check if the event passes the filter of the hub."""
+        return self._hub_predicate(event)
 
     def consume(self, event, *args, **kwargs):
-        """Consume the event by all the consumers."""
-        if self._hub_event_filter(event):
-            self.signal.send(event)
+        """Consume the event by all the consumers.
+
+        The event is serialized once for all of them.
+        """
+        if self._hub_predicate(event):
+            with event.serialized_once():
+                self.signal.send(event)
+
+    def consume_many(self, events, *args, **kwargs):
+        """Consume the events passing the filter in a single chunk."""
+        events = [event for event in events if self._hub_predicate(event)]
+        if events:
+            self.dispatch_many(events)
+
+    def dispatch_many(self, events, payloads=None):
+        """Send a chunk of already filtered events to all the consumers.
+
+        Every consumer receives the whole chunk in one task.
+
+        :param payloads: The events already serialized, otherwise they are
+                         serialized once for all the consumers
+        """
+        if payloads is None:
+            payloads = [event.to_json() for event in events]
+        self.many_signal.send(events, payloads=payloads)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Executors running the consumers of a hub."""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+
+from flask_notifications.codecs.codec import to_timestamp
+from flask_notifications.deadlines import expired
+from flask_notifications.drop_counters import DropCounters
+from flask_notifications.priorities import NORMAL
+
+#: Consumers run as Celery tasks, by the workers
+CELERY = "celery"
+#: Consumers run when the event is sent, in the same thread
+INLINE = "inline"
+#: Consumers run in a pool of threads of the process sending the event
+THREAD_POOL = "thread-pool"
+#: Consumers run in a pool of processes, they must be picklable
+PROCESS_POOL = "process-pool"
+
+logger = logging.getLogger(__name__)
+
+# Consumers of the process pools, by name, installed once in every worker
+# process so they keep their state between the events
+_installed_consumers = {}
+
+
+def consume_many(consumer, events_json):
+    """Consume a chunk of events, with the consumer's consume_many if any."""
+    consume = getattr(consumer, "consume_many", None)
+    if consume is not None:
+        return consume(events_json)
+    for event_json in events_json:
+        consumer(event_json)
+
+
+def install_consumers(consumers):
+    """Install the consumers run by a worker process, by name."""
+    _installed_consumers.update(consumers)
+
+
+def consume_installed(name, event_json):
+    """Consume an event with a consumer installed in the process."""
+    return _installed_consumers[name](event_json)
+
+
+def consume_many_installed(name, events_json):
+    """Consume a chunk of events with a consumer installed in the process."""
+    return consume_many(_installed_consumers[name], events_json)
+
+
+class InlineExecutor(object):
+    """Run the consumers immediately, without a task."""
+
+    def __init__(self, name=INLINE, dropped=None):
+        """Initialise the counters of dropped events.
+
+        :param name: Stage of the executor in the counters
+        :param dropped: :class DropCounters: of the expired events
+        """
+        self.name = name
+        self.dropped = dropped if dropped is not None else DropCounters()
+
+    def submit(self, deadline, fn, *args, **options):
+        """Run a function and return its result, unless expired.
+
+        Errors are logged, so a failing consumer does not stop the
+        delivery of the event to the others.
+
+        :param deadline: Datetime after which the function is not run
+        :param lane: Priority lane, ignored as the function runs now
+        """
+        if expired(deadline):
+            self.dropped.increment(self.name)
+            return None
+        try:
+            return fn(*args)
+        except Exception:
+            logger.exception("Consumer failed")
+
+    def shutdown(self, wait=True):
+        """Nothing to release."""
+
+
+class PoolExecutor(object):
+    """Run the consumers in a bounded pool, earliest deadline first.
+
+    The functions wait in a queue per priority lane, ordered by deadline,
+    the ones without deadline last, until a worker of the pool is free.
+    The free workers serve the lanes in proportion to their weights, with
+    a smooth weighted round robin, so urgent lanes are served first
+    without starving the others. Functions whose deadline passes while
+    waiting are dropped. At most ``max_pending`` functions wait or run
+    at the same time; submitting another one blocks until one of them
+    finishes.
+    """
+
+    def __init__(self, pool, max_workers, max_pending, name=None,
+                 dropped=None, weights=None):
+        """Initialise the pool and the queue of pending functions.
+
+        :param pool: :class concurrent.futures.Executor: running the
+                     functions
+        :param max_workers: Number of workers of the pool
+        :param max_pending: Maximum number of functions waiting or running
+        :param name: Stage of the executor in the counters
+        :param dropped: :class DropCounters: of the expired events
+        :param weights: Weight of each priority lane, ``1`` by default
+        """
+        self.pool = pool
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.name = name
+        self.dropped = dropped if dropped is not None else DropCounters()
+        self.weights = weights or {}
+
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._credits = {}
+        self._waiting = 0
+        self._sequence = itertools.count()
+        self._running = 0
+
+    def submit(self, deadline, fn, *args, **options):
+        """Queue a function and return its future.
+
+        The future is cancelled if the function is dropped.
+
+        :param deadline: Datetime after which the function is not run
+        :param lane: Priority lane of the function, :data NORMAL: by default
+        """
+        lane = options.pop("lane", None) or NORMAL
+        if options:
+            raise TypeError("Unexpected options {0}".format(sorted(options)))
+
+        future = Future()
+        key = (deadline is None,
+               0 if deadline is None else to_timestamp(deadline),
+               next(self._sequence))
+        with self._condition:
+            while self._waiting + self._running >= self.max_pending:
+                self._condition.wait()
+            heapq.heappush(self._queues.setdefault(lane, []),
+                           (key, deadline, fn, args, future))
+            self._waiting += 1
+            self._start_next()
+        return future
+
+    def shutdown(self, wait=True):
+        """Release the workers of the pool."""
+        with self._condition:
+            while wait and (self._waiting or self._running):
+                self._condition.wait()
+        self.pool.shutdown(wait)
+
+    def _next_lane(self):
+        lanes = [lane for lane, queue in self._queues.items() if queue]
+        total = 0
+        for lane in lanes:
+            weight = self.weights.get(lane, 1)
+            self._credits[lane] = self._credits.get(lane, 0) + weight
+            total += weight
+        lane = max(lanes, key=lambda lane: self._credits[lane])
+        self._credits[lane] -= total
+        return lane
+
+    def _start_next(self):
+        # Called with the condition held
+        while self._waiting and self._running < self.max_workers:
+            queue = self._queues[self._next_lane()]
+            _, deadline, fn, args, future = heapq.heappop(queue)
+            self._waiting -= 1
+            if expired(deadline):
+                self.dropped.increment(self.name)
+                future.cancel()
+                self._condition.notify_all()
+                continue
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._running += 1
+            self.pool.submit(fn, *args).add_done_callback(
+                lambda done, future=future: self._done(done, future)
+            )
+
+    def _done(self, done, future):
+        error = done.exception()
+        if error is None:
+            future.set_result(done.result())
+        else:
+            logger.error("Consumer failed", exc_info=error)
+            future.set_exception(error)
+
+        with self._condition:
+            self._running -= 1
+            self._start_next()
+            self._condition.notify_all()
+
+
+class Scheduler(object):
+    """Call functions after a delay, from a single daemon thread.
+
+    The deferred functions wait in a heap instead of a thread or a worker
+    each.
+    """
+
+    def __init__(self):
+        """Initialise the heap of deferred functions."""
+        self._condition = threading.Condition()
+        self._calls = []
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def __len__(self):
+        """Get the number of functions waiting."""
+        return len(self._calls)
+
+    def call_later(self, delay, fn, *args):
+        """Call a function in ``delay`` seconds."""
+        call = (time.time() + delay, next(self._sequence), fn, args)
+        with self._condition:
+            heapq.heappush(self._calls, call)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._calls or self._calls[0][0] > time.time():
+                    timeout = self._calls[0][0] - time.time() \
+                        if self._calls else None
+                    self._condition.wait(timeout)
+                _, _, fn, args = heapq.heappop(self._calls)
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Deferred consumer failed")
+
+
+def create_executor(name, max_workers=4, max_pending=1000, dropped=None,
+                    weights=None, consumers=None):
+    """Create an executor from its name, other than :data CELERY:.
+
+    The worker processes of a :data PROCESS_POOL: install the consumers
+    once, and run them with :func consume_installed: and
+    :func consume_many_installed:.
+
+    :param name: :data INLINE:, :data THREAD_POOL: or :data PROCESS_POOL:
+    :param max_workers: Number of threads or processes of a pool
+    :param max_pending: Maximum number of consumers waiting or running in
+                        a pool
+    :param dropped: :class DropCounters: of the expired events
+    :param weights: Weight of each priority lane in a pool
+    :param consumers: Consumers of a process pool, by name
+    """
+    if name == INLINE:
+        return InlineExecutor(name, dropped)
+    if name == THREAD_POOL:
+        pool = ThreadPoolExecutor(max_workers)
+    elif name == PROCESS_POOL:
+        pool = ProcessPoolExecutor(max_workers,
+                                   initializer=install_consumers,
+                                   initargs=(consumers or {},))
+    else:
+        raise ValueError("Unknown executor {0}".format(name))
+    return PoolExecutor(pool, max_workers, max_pending, name, dropped,
+                        weights)
@@ -28,3 +28,11 @@ class AfterDate(EventFilter):
         """Check both dates."""
         return (datetime.fromtimestamp(event["timestamp"]) >
                 self.target_datetime)
+
+    def expression(self, bind):
+        """Inline the comparison of both dates."""
+        if not self._inlines(AfterDate):
+            return super(AfterDate, self).expression(bind)
+        return '({0}(event["timestamp"]) > {1})'.format(
+            bind(datetime.fromtimestamp), bind(self.target_datetime)
+        )
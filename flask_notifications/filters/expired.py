@@ -9,8 +9,7 @@
 
 """Expired filter declaration."""
 
-from datetime import datetime
-
+from flask_notifications.deadlines import expired
 from flask_notifications.event_filter import EventFilter
 
 
@@ -19,4 +18,10 @@ class Expired(EventFilter):
 
     def filter(self, event, *args, **kwargs):
         """Check expiration of event."""
-        return event["expiration_datetime"] <= datetime.now()
+        return expired(event["expiration_datetime"])
+
+    def expression(self, bind):
+        """Inline the check of the expiration."""
+        if not self._inlines(Expired):
+            return super(Expired, self).expression(bind)
+        return '{0}(event["expiration_datetime"])'.format(bind(expired))
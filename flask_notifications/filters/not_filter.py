@@ -22,3 +22,9 @@ class Not(EventFilter):
     def filter(self, event, *args, **kwargs):
         """Negate condition."""
         return not self.event_filter(event)
+
+    def expression(self, bind):
+        """Negate the expression of the filter."""
+        if not self._inlines(Not):
+            return super(Not, self).expression(bind)
+        return "(not {0})".format(self.event_filter.expression(bind))
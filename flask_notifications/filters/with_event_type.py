@@ -22,3 +22,17 @@ class WithEventType(EventFilter):
     def filter(self, event, *args, **kwargs):
         """Check event types."""
         return event["event_type"] == self.target_event_type
+
+    def expression(self, bind):
+        """Inline the comparison."""
+        if not self._inlines(WithEventType):
+            return super(WithEventType, self).expression(bind)
+        return '(event["event_type"] == {0})'.format(
+            bind(self.target_event_type)
+        )
+
+    def index_terms(self):
+        """Index the event by its type."""
+        if not self._inlines(WithEventType):
+            return None
+        return [("event_type", self.target_event_type)]
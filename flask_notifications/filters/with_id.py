@@ -22,3 +22,15 @@ class WithId(EventFilter):
     def filter(self, event, *args, **kwargs):
         """Check event type."""
         return event["event_id"] == self.target_id
+
+    def expression(self, bind):
+        """Inline the comparison."""
+        if not self._inlines(WithId):
+            return super(WithId, self).expression(bind)
+        return '(event["event_id"] == {0})'.format(bind(self.target_id))
+
+    def index_terms(self):
+        """Index the event by its id."""
+        if not self._inlines(WithId):
+            return None
+        return [("event_id", self.target_id)]
@@ -23,3 +23,17 @@ class WithRecipients(EventFilter):
         """Check that all the recipients are included in the event."""
         set_recipients = set(event["recipients"])
         return len(set_recipients ^ self.target_recipients) == 0
+
+    def expression(self, bind):
+        """Inline the comparison of both sets."""
+        if not self._inlines(WithRecipients):
+            return super(WithRecipients, self).expression(bind)
+        return '({0}(event["recipients"]) == {1})'.format(
+            bind(set), bind(self.target_recipients)
+        )
+
+    def index_terms(self):
+        """Index the event by its recipients."""
+        if not self._inlines(WithRecipients):
+            return None
+        return [("recipients", frozenset(self.target_recipients))]
@@ -22,3 +22,15 @@ class WithSender(EventFilter):
     def filter(self, event, *args, **kwargs):
         """Check the sender of the event."""
         return event["sender"] == self.target_sender
+
+    def expression(self, bind):
+        """Inline the comparison."""
+        if not self._inlines(WithSender):
+            return super(WithSender, self).expression(bind)
+        return '(event["sender"] == {0})'.format(bind(self.target_sender))
+
+    def index_terms(self):
+        """Index the event by its sender."""
+        if not self._inlines(WithSender):
+            return None
+        return [("sender", self.target_sender)]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""HubIndex declaration."""
+
+
+class HubIndex(object):
+    """Index of hubs by the terms their filters require.
+
+    The filter of a hub can give the terms (see
+    :method EventFilter.index_terms:) that any event matching it must have.
+    Only the hubs indexed under a term of an event, plus the hubs whose
+    filter cannot be indexed, are candidates to consume that event.
+    """
+
+    def __init__(self):
+        """Initialise the index with no hubs."""
+        self._hubs = {}
+        self._terms = {}
+        self._hub_terms = {}
+        self._unindexed = {}
+
+    def __len__(self):
+        """Return the number of indexed hubs."""
+        return len(self._hubs)
+
+    def add(self, hub):
+        """Index a hub, replacing any previous hub with the same id."""
+        self.remove(hub.hub_id)
+        self._hubs[hub.hub_id] = hub
+
+        terms = hub._hub_event_filter.index_terms()
+        try:
+            for field, value in terms or ():
+                self._terms.setdefault(field, {}) \
+                    .setdefault(value, {})[hub.hub_id] = hub
+        except TypeError:
+            # Values that cannot be hashed cannot be indexed either
+            self._remove_terms(hub.hub_id, terms)
+            terms = None
+
+        if terms is None:
+            self._unindexed[hub.hub_id] = hub
+        else:
+            self._hub_terms[hub.hub_id] = terms
+
+    def update(self, hub):
+        """Index again a hub whose filter has changed."""
+        if self._hubs.get(hub.hub_id) is hub:
+            self.add(hub)
+
+    def remove(self, hub_id):
+        """Remove a hub from the index."""
+        if self._hubs.pop(hub_id, None) is None:
+            return
+        self._unindexed.pop(hub_id, None)
+        self._remove_terms(hub_id, self._hub_terms.pop(hub_id, None))
+
+    def _remove_terms(self, hub_id, terms):
+        for field, value in terms or ():
+            try:
+                hubs = self._terms[field][value]
+            except (KeyError, TypeError):
+                continue
+            hubs.pop(hub_id, None)
+            if not hubs:
+                del self._terms[field][value]
+
+    def candidates(self, event):
+        """Return the hubs whose filters may match the event."""
+        candidates = dict(self._unindexed)
+        for field, index in self._terms.items():
+            try:
+                value = event[field]
+                if field == "recipients":
+                    value = frozenset(value)
+                candidates.update(index.get(value, ()))
+            except (KeyError, TypeError):
+                continue
+        return list(candidates.values())
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""LRUDict declaration."""
+
+from collections import OrderedDict
+
+
+class LRUDict(object):
+    """Mapping keeping the ``max_size`` most recently used keys.
+
+    It is not thread-safe, the callers hold their own lock.
+    """
+
+    def __init__(self, max_size):
+        """Initialise an empty mapping."""
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def __len__(self):
+        """Get the number of keys kept."""
+        return len(self._items)
+
+    def __contains__(self, key):
+        """Check if a key is kept, without marking it as used."""
+        return key in self._items
+
+    def get(self, key, default=None):
+        """Get the value of a key, marking it as the most recently used."""
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return default
+        self._items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        """Set the value of a key, forgetting the least recently used one."""
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def discard(self, key):
+        """Forget a key, if kept."""
+        self._items.pop(key, None)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Priority lanes of the events."""
+
+HIGH = "high"
+NORMAL = "normal"
+LOW = "low"
+
+#: Lanes from the most to the least urgent
+LANES = (HIGH, NORMAL, LOW)
+
+
+class PriorityLanes(object):
+    """Map the priority of the events to lanes and task options.
+
+    The lane of an event is its ``priority`` field, or the priority of its
+    event type, or the one of the hub, or :data NORMAL:. Each lane can be
+    sent to its own Celery queue, which dedicated workers consume, and
+    with a broker priority. The in-process pools serve the lanes in
+    proportion to their weights.
+    """
+
+    def __init__(self, event_types=None, queues=None, levels=None,
+                 weights=None):
+        """Initialise the mappings of the lanes.
+
+        :param event_types: Lane of each event type
+        :param queues: Celery queue of each lane, by default the default
+                       queue of Celery
+        :param levels: Broker priority of each lane, whose meaning depends
+                       on the broker
+        :param weights: Share of the in-process pools given to each lane
+        """
+        self.event_types = event_types or {}
+        self.queues = queues or {}
+        self.levels = levels or {}
+        self.weights = weights or {HIGH: 6, NORMAL: 3, LOW: 1}
+
+    def lane(self, event, hub_priority=None):
+        """Get the lane of an event sent through a hub."""
+        return event.get("priority") or \
+            self.event_types.get(event["event_type"]) or \
+            hub_priority or NORMAL
+
+    def most_urgent(self, lanes):
+        """Get the most urgent of several lanes."""
+        return min(lanes, key=lambda lane: LANES.index(lane)
+                   if lane in LANES else len(LANES))
+
+    def task_options(self, lane):
+        """Get the options of the Celery tasks of a lane."""
+        options = {}
+        if self.queues.get(lane) is not None:
+            options["queue"] = self.queues[lane]
+        if self.levels.get(lane) is not None:
+            options["priority"] = self.levels[lane]
+        return options
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Token-bucket rate limits of the consumers."""
+
+import math
+import threading
+import time
+
+from flask_notifications.lru import LRUDict
+
+#: One bucket per recipient of the events
+RECIPIENT = "recipient"
+#: One bucket per sender of the events
+SENDER = "sender"
+#: One bucket for all the events of the consumer
+CONSUMER = "consumer"
+
+#: Events over the limit are consumed later, when there are tokens again
+DEFER = "defer"
+#: Events over the limit are not consumed
+DROP = "drop"
+
+_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local max_delay = tonumber(ARGV[4])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call("HMGET", key, "tokens", "timestamp")
+    local available = tonumber(bucket[1])
+    if available == nil then
+        available = capacity
+    else
+        local elapsed = math.max(0, now - tonumber(bucket[2]))
+        available = math.min(capacity, available + elapsed * rate)
+    end
+    tokens[i] = available - 1
+    if tokens[i] < 0 then
+        wait = math.max(wait, -tokens[i] / rate)
+    end
+end
+if max_delay >= 0 and wait > max_delay then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call("HMSET", key, "tokens", tostring(tokens[i]),
+               "timestamp", tostring(now))
+    redis.call("PEXPIRE", key,
+               math.ceil((capacity - tokens[i]) / rate * 1000) + 1000)
+end
+return {1, tostring(wait)}
+"""
+
+
+class LocalTokenBuckets(object):
+    """Token buckets kept in the memory of the process.
+
+    The least recently used buckets are forgotten beyond ``max_keys``,
+    which gives them their full capacity again.
+    """
+
+    def __init__(self, max_keys=10000):
+        """Initialise the buckets.
+
+        :param max_keys: Maximum number of buckets kept
+        """
+        self._lock = threading.Lock()
+        self._buckets = LRUDict(max_keys)
+
+    def acquire(self, keys, rate, capacity, max_delay=None, now=None):
+        """Take a token from every bucket, as soon as they all have one.
+
+        The buckets may go in debt, so the tokens of the deferred events
+        are reserved in the order they come.
+
+        :param keys: Keys of the buckets
+        :param rate: Tokens added to each bucket per second
+        :param capacity: Maximum number of tokens of a bucket
+        :param max_delay: Maximum seconds to wait for the tokens, without
+                          limit if None
+        :param now: Current timestamp, by default the time of the system
+        :returns: The seconds to wait before consuming, or None if it is
+                  longer than ``max_delay`` and no token was taken
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens = []
+            wait = 0
+            for key in keys:
+                available, timestamp = self._buckets.get(key, (capacity, now))
+                available = min(capacity, available +
+                                max(0, now - timestamp) * rate) - 1
+                tokens.append(available)
+                if available < 0:
+                    wait = max(wait, -available / float(rate))
+
+            if max_delay is not None and wait > max_delay:
+                return None
+            for key, available in zip(keys, tokens):
+                self._buckets[key] = (available, now)
+            return wait
+
+
+class RedisTokenBuckets(object):
+    """Token buckets kept in Redis, shared by every process and worker.
+
+    Every acquisition is a single Lua script, so the buckets are updated
+    atomically. The buckets expire once they would be full again.
+    """
+
+    def __init__(self, redis, prefix="flask-notifications:rate-limit:"):
+        """Initialise the script taking the tokens.
+
+        :param redis: :class redis.StrictRedis: connection
+        :param prefix: Prefix of the keys of the buckets in Redis
+        """
+        self.redis = redis
+        self.prefix = prefix
+        self._acquire = redis.register_script(_ACQUIRE_SCRIPT)
+
+    def acquire(self, keys, rate, capacity, max_delay=None, now=None):
+        """Take a token from every bucket, see :class LocalTokenBuckets:."""
+        now = time.time() if now is None else now
+        taken, wait = self._acquire(
+            keys=[self.prefix + key for key in keys],
+            args=[repr(float(rate)), repr(float(capacity)), repr(now),
+                  -1 if max_delay is None else repr(float(max_delay))]
+        )
+        return float(wait) if int(taken) else None
+
+
+class RateLimit(object):
+    """Limit of the events consumed per second by a consumer.
+
+    Each event takes a token from the bucket of the consumer for its
+    sender, each of its recipients, or the consumer itself. Events over
+    the limit are deferred until there are tokens for them, up to
+    ``max_delay``, or dropped.
+    """
+
+    def __init__(self, rate, capacity=None, key=RECIPIENT, policy=DEFER,
+                 max_delay=None, buckets=None):
+        """Initialise the limit.
+
+        :param rate: Events per second allowed for each key
+        :param capacity: Burst of events allowed for each key, by default
+                         a second of events
+        :param key: :data RECIPIENT:, :data SENDER: or :data CONSUMER:
+        :param policy: :data DEFER: or :data DROP:
+        :param max_delay: Maximum seconds an event is deferred before
+                          being dropped instead, without limit if None
+        :param buckets: :class LocalTokenBuckets: by default, or
+                        :class RedisTokenBuckets: to share the limit
+        """
+        if key not in (RECIPIENT, SENDER, CONSUMER):
+            raise ValueError("Unknown rate limit key {0}".format(key))
+        if policy not in (DEFER, DROP):
+            raise ValueError("Unknown rate limit policy {0}".format(policy))
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else \
+            max(1, int(math.ceil(rate)))
+        self.key = key
+        self.policy = policy
+        self.max_delay = 0 if policy == DROP else max_delay
+        self.buckets = buckets if buckets is not None else \
+            LocalTokenBuckets()
+
+    def keys(self, event, name):
+        """Get the keys of the buckets of an event for a consumer."""
+        if self.key == RECIPIENT:
+            return ["{0}:{1}".format(name, recipient)
+                    for recipient in event["recipients"]]
+        if self.key == SENDER:
+            return ["{0}:{1}".format(name, event["sender"])]
+        return [name]
+
+    def delay(self, event, name):
+        """Get the seconds before a consumer can consume an event.
+
+        :param name: Name of the consumer, which has its own buckets
+        :returns: The seconds to wait, ``0`` to consume it now, or None if
+                  it is dropped
+        """
+        keys = self.keys(event, name)
+        if not keys:
+            return 0
+        return self.buckets.acquire(keys, self.rate, self.capacity,
+                                    self.max_delay)
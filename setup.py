@@ -30,6 +30,7 @@ tests_require = [
     'coverage>=4.0',
     'flask-email>=1.4.4',
     'flask-mail>=0.9.1',
+    'msgpack>=0.5.2',
     'pydocstyle>=1.0.0',
 ]
 
@@ -61,7 +62,9 @@ setup(
         'docs': ['sphinx'],
         'tests': tests_require,
         'flask-email': ['Flask-Email'],
-        'flask-mail': ['Flask-Mail']
+        'flask-mail': ['Flask-Mail'],
+        'msgpack': ['msgpack>=0.5.2'],
+        ':python_version<"3"': ['futures>=3.0'],
     },
     tests_require=tests_require,
     classifiers=[
@@ -79,6 +82,7 @@ setup(
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
         'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3.6',
         'Development Status :: 4 - Beta'
     ],
 )
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Configuration of the tests."""
+
+import sys
+
+# The asyncio tests do not even compile before Python 3.6
+collect_ignore = ["test_async.py"] if sys.version_info < (3, 6) else []
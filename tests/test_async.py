@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Flask-Notifications
+# Copyright (C) 2016 CERN.
+#
+# Flask-Notifications is free software; you can redistribute it and/or modify
+# it under the terms of the Revised BSD License; see LICENSE file for
+# more details.
+
+"""Tests of the asyncio backends and notifier.
+
+They require Python 3.6 or later.
+"""
+
+import asyncio
+import unittest
+import uuid
+
+from redis.asyncio import Redis
+
+from flask_notifications.backend.async_redis_backend import \
+    AsyncRedisBackend
+from flask_notifications.consumers.push.async_ssenotifier import \
+    AsyncSseNotifier
+
+
+class AsyncTestCase(unittest.TestCase):
+
+    """Base test class running coroutines in an event loop."""
+
+    def setUp(self):
+        """Create the event loop and a channel."""
+        self.loop = asyncio.new_event_loop()
+        self.channel = "TestAsync-{0}".format(uuid.uuid4().hex)
+
+    def tearDown(self):
+        """Close the event loop."""
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        """Run a coroutine until it completes, at most a few seconds."""
+        return self.loop.run_until_complete(
+            asyncio.wait_for(coroutine, 5)
+        )
+
+
+class AsyncBackendTest(AsyncTestCase):
+
+    def test_redis_backend(self):
+        """Published messages reach the subscribers."""
+        async def publish_and_listen():
+            subscriber = AsyncRedisBackend(Redis())
+            await subscriber.subscribe(self.channel)
+            messages = subscriber.listen()
+            assert (await messages.__anext__())["type"] == "subscribe"
+
+            publisher = AsyncRedisBackend(Redis())
+            assert await publisher.publish(self.channel, "first") == 1
+            message = await messages.__anext__()
+            assert message["type"] == "message"
+            assert message["data"] == b"first"
+            await messages.aclose()
+
+        self.run_async(publish_and_listen())
+
+
+class AsyncSseNotifierTest(AsyncTestCase):
+
+    def setUp(self):
+        """Create a notifier and an ASGI client."""
+        super(AsyncSseNotifierTest, self).setUp()
+        self.notifier = AsyncSseNotifier(AsyncRedisBackend(Redis()),
+                                         self.channel, heartbeat=60)
+        self.sent = []
+        self.received = None
+
+    def tearDown(self):
+        """Close the streams."""
+        self.notifier.close()
+        super(AsyncSseNotifierTest, self).tearDown()
+
+    async def send(self, message):
+        """Keep the messages sent by the application."""
+        self.sent.append(message)
+
+    async def receive(self):
+        """Wait for the next message of the server."""
+        return await self.received.get()
+
+    def bodies(self):
+        """Get the bodies streamed to the client."""
+        return [message["body"] for message in self.sent
+                if message["type"] == "http.response.body"]
+
+    async def wait_for(self, condition):
+        """Wait until a condition holds."""
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    def request(self, last_event_id=None):
+        """Start a request streaming the messages."""
+        self.received = asyncio.Queue()
+        headers = []
+        if last_event_id is not None:
+            headers.append((b"last-event-id", last_event_id.encode()))
+        scope = {"type": "http", "headers": headers}
+        return asyncio.ensure_future(
+            self.notifier(scope, self.receive, self.send)
+        )
+
+    def test_streaming(self):
+        """The published messages are streamed to the clients."""
+        async def stream():
+            request = self.request()
+            await self.wait_for(lambda: len(self.bodies()) == 1)
+            assert self.sent[0]["status"] == 200
+            assert self.bodies()[0].startswith(b"retry")
+
+            publisher = AsyncRedisBackend(Redis())
+            await self.wait_for(lambda: self.notifier._tasks)
+            while len(self.bodies()) == 1:
+                await publisher.publish(self.channel, "first")
+                await asyncio.sleep(0.01)
+            assert b"data: first" in self.bodies()[1]
+
+            # The streams end when the server shuts down
+            self.notifier.close()
+            await request
+            assert self.bodies()[-1] == b""
+
+        self.run_async(stream())
+
+    def test_replay(self):
+        """Clients sending a Last-Event-ID get the messages they missed."""
+        async def replay():
+            for body in ("first", "second", "third"):
+                self.notifier.publish(body)
+            first_id = "{0}-1".format(self.notifier.replay.token)
+
+            request = self.request(first_id)
+            await self.wait_for(lambda: len(self.bodies()) == 3)
+            assert b"data: second" in self.bodies()[1]
+            assert b"data: third" in self.bodies()[2]
+
+            self.received.put_nowait({"type": "http.disconnect"})
+            await request
+
+        self.run_async(replay())
+
+    def test_disconnect(self):
+        """Disconnected clients are forgotten."""
+        async def disconnect():
+            request = self.request()
+            await self.wait_for(lambda: self.notifier.clients)
+            self.received.put_nowait({"type": "http.disconnect"})
+            await request
+            await self.wait_for(lambda: not self.notifier.clients)
+
+        self.run_async(disconnect())
+
+    def test_lifespan(self):
+        """The application completes the startup and the shutdown."""
+        async def lifespan():
+            self.received = asyncio.Queue()
+            self.received.put_nowait({"type": "lifespan.startup"})
+            self.received.put_nowait({"type": "lifespan.shutdown"})
+            await self.notifier({"type": "lifespan"}, self.receive,
+                                self.send)
+            assert self.sent == [{"type": "lifespan.startup.complete"},
+                                 {"type": "lifespan.shutdown.complete"}]
+
+            with self.assertRaises(ValueError):
+                await self.notifier({"type": "websocket"}, self.receive,
+                                    self.send)
+
+        self.run_async(lifespan())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,24 +7,58 @@
 # it under the terms of the Revised BSD License; see LICENSE file for
 # more details.
 
+import logging
 import os
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
 import unittest
+import uuid
+from json import loads
 from datetime import datetime
 from datetime import timedelta
+from datetime import tzinfo
 from six import next
 from six.moves import filter
 
 from celery import Celery
 from flask import Flask
+from jinja2 import DictLoader, Environment
+from jsonschema import ValidationError
 from redis import StrictRedis
 
 from flask_notifications import Notifications
+from flask_notifications.backend.local_backend import LocalBroker
+from flask_notifications.backend.redis_streams_backend import \
+    RedisStreamsBackend
+from flask_notifications.codecs.json_codec import JSONCodec
+from flask_notifications.codecs.msgpack_codec import MsgpackCodec
+from flask_notifications.compact_event import CompactEvent
+from flask_notifications.deduplication import Deduplicator, LocalSeenIds
 from flask_notifications.event import Event
+from flask_notifications.event_filter import AndFilter
 from flask_notifications.event_hub import EventHub
+from flask_notifications.executors import INLINE, PROCESS_POOL, \
+    THREAD_POOL, create_executor
+from flask_notifications.consumers.email.email_consumer import \
+    EmailConsumer
+from flask_notifications.consumers.email.email_templates import \
+    EmailTemplates
 from flask_notifications.consumers.email.flaskmail_consumer import \
     FlaskMailConsumer
 from flask_notifications.consumers.push.push_consumer import PushConsumer
-from flask_notifications.consumers.log.log_consumer import LogConsumer
+from flask_notifications.consumers.push.replay_buffer import ReplayBuffer
+from flask_notifications.consumers.push.ssenotifier import SseNotifier
+from flask_notifications.consumers.log.archive_consumer import \
+    ArchiveConsumer, ArchiveReader
+from flask_notifications.consumers.log.log_consumer import FSYNC_COMMIT, \
+    LogConsumer, read_events
+from flask_notifications.priorities import HIGH, LOW, NORMAL, \
+    PriorityLanes
+from flask_notifications.rate_limits import CONSUMER, DROP, \
+    LocalTokenBuckets, RedisTokenBuckets
 from flask_notifications.filters.before_date import BeforeDate
 from flask_notifications.filters.after_date import AfterDate
 from flask_notifications.filters.expired import Expired
@@ -35,6 +69,36 @@ from flask_notifications.filters.with_event_type import WithEventType
 from flask_notifications.filters.not_filter import Not
 
 
+class UTC(tzinfo):
+
+    """Timezone of the timezone-aware datetimes of the tests."""
+
+    def utcoffset(self, dt):
+        """No offset."""
+        return timedelta(0)
+
+    def tzname(self, dt):
+        """Name of the timezone."""
+        return "UTC"
+
+    def dst(self, dt):
+        """No daylight saving time."""
+        return timedelta(0)
+
+
+class TokenLogConsumer(LogConsumer):
+
+    """Log the token of the copy of the consumer instead of the events."""
+
+    def _init_state(self):
+        super(TokenLogConsumer, self)._init_state()
+        self.token = uuid.uuid4().hex
+
+    def write_event(self, event_json):
+        """Write the token."""
+        return self.token
+
+
 class NotificationsFlaskTestCase(unittest.TestCase):
 
     """Base test class for Flask-Notifications."""
@@ -114,6 +178,87 @@ class EventsTest(NotificationsFlaskTestCase):
             assert event_from_parser["title"] == self.event["title"]
             assert event_from_parser["body"] == self.event["body"]
 
+    def test_cached_validator(self):
+        """The validator is only built again if the schema changes."""
+        class CustomEvent(Event):
+            schema = dict(Event.schema)
+
+        validator = CustomEvent.validator()
+        assert CustomEvent.validator() is validator
+        assert Event.validator() is not validator
+
+        CustomEvent.schema = dict(Event.schema)
+        assert CustomEvent.validator() is not validator
+
+    def test_fast_validation(self):
+        """The fast validation checks required fields and types."""
+        class FastEvent(Event):
+            validation = "fast"
+
+        FastEvent("1234", "user", "Title", "Body")
+        self.assertRaises(ValidationError, FastEvent,
+                          "1234", "user", 1234, "Body")
+        self.assertRaises(ValidationError, FastEvent,
+                          "1234", "user", "Title", "Body", timestamp=True)
+
+        event = FastEvent("1234", "user", "Title", "Body")
+        del event["sender"]
+        self.assertRaises(ValidationError, event.validate)
+
+    def test_trusted_json_parser(self):
+        """Trusted events are decoded without being validated."""
+        with self.app.test_request_context():
+            event = Event.from_json(self.event_json, trusted=True)
+            assert event.data == Event.from_json(self.event_json).data
+
+    def test_compact_event(self):
+        """CompactEvent behaves as an Event."""
+        with self.app.test_request_context():
+            event = CompactEvent.from_json(self.event_json)
+            assert event.data == Event.from_json(self.event_json).data
+            assert not hasattr(event, "__dict__")
+
+            event["custom"] = "value"
+            assert event["custom"] == "value"
+            assert len(event) == len(self.event) + 1
+
+            f = WithEventType("user") & WithRecipients(["jvican"])
+            assert f(event) is True
+            assert f.compile()(event) is True
+
+            event_json = event.to_json()
+            assert CompactEvent.from_json(event_json, trusted=True) == event
+
+    def test_codecs(self):
+        """Every codec decodes the events it encodes."""
+        class CodecEvent(Event):
+            pass
+
+        for codec in (JSONCodec(), MsgpackCodec()):
+            codec.register()
+            CodecEvent.codec = codec
+            event = CodecEvent(**self.event.data)
+            payload = event.to_json()
+            assert CodecEvent.from_json(payload).data == event.data
+            assert loads(codec.to_text(payload))["title"] == event["title"]
+
+            # Logs hold the events as text, whatever the codec
+            with tempfile.NamedTemporaryFile("w", delete=False) as f:
+                f.write(u"{0}\n".format(codec.to_text(payload)))
+            try:
+                logged, = read_events(f.name, event_cls=CodecEvent)
+                assert logged.data == event.data
+            finally:
+                os.remove(f.name)
+
+        # The codec of the events is shared by the applications
+        app = Flask(__name__)
+        app.config.update(self.config)
+        app.config["NOTIFICATIONS_CODEC"] = \
+            "flask_notifications.codecs.json_codec.JSONCodec"
+        self.assertRaises(RuntimeError, Notifications, app=app,
+                          celery=self.celery, broker=self.redis)
+
 
 class FlaskMailNotificationTest(NotificationsFlaskTestCase):
 
@@ -138,7 +283,127 @@ class FlaskMailNotificationTest(NotificationsFlaskTestCase):
 
                 assert len(outbox) == 1
                 assert outbox[0].subject == expected
-                assert outbox[0].body == self.event_json
+                # The body is the event, without the other recipients
+                body = loads(self.event_json)
+                del body["recipients"]
+                assert loads(outbox[0].body) == body
+
+    def test_templates(self):
+        """Emails are rendered once and sent to the event's recipients."""
+        environment = Environment(loader=DictLoader({
+            "notifications/email/user_subject.txt": "Hello {{ event.title }}",
+            "notifications/email/user.txt": "User: {{ event.body }}",
+            "notifications/email/default.txt": "Default: {{ event.body }}",
+        }))
+        templates = EmailTemplates(environment, cache_size=1)
+        email_consumer = FlaskMailConsumer(
+            self.flaskmail.mail, self.default_email_account,
+            templates=templates, recipients_per_message=2
+        )
+        recipients = ["user{0}@localhost".format(i) for i in range(5)]
+        event = Event(None, "user", "title", "body", recipients=recipients)
+
+        with self.app.test_request_context():
+            with self.flaskmail.mail.record_messages() as outbox:
+                email_consumer(event.to_json())
+
+                assert [message.bcc for message in outbox] == \
+                    [recipients[:2], recipients[2:4], recipients[4:]]
+                assert outbox[0].subject == "Hello title"
+                assert outbox[0].body == "User: body"
+
+                event["event_type"] = "system"
+                email_consumer(event.to_json())
+                assert outbox[-1].subject == \
+                    "Event {0}".format(event["event_id"])
+                assert outbox[-1].body == "Default: body"
+
+        # Only the templates of the last event type are kept
+        assert len(templates._cache) == 1
+
+        # Without templates, the recipients do not see each other
+        email_consumer.templates = None
+        with self.app.test_request_context():
+            with self.flaskmail.mail.record_messages() as outbox:
+                email_consumer(event.to_json())
+                assert len(outbox) == 3
+                assert not any(recipient in message.body
+                               for message in outbox
+                               for recipient in recipients)
+
+        # The events are decoded with the event class of the consumer
+        class CustomEvent(Event):
+            pass
+
+        email_consumer.event_class = CustomEvent
+        email_consumer.render = lambda event, event_json: \
+            (type(event).__name__, "")
+        assert email_consumer.create_message(event.to_json()).subject == \
+            "CustomEvent"
+
+    def test_create_message_hook(self):
+        """Consumers overriding create_message keep working."""
+        class Mailbox(object):
+            def __init__(self):
+                self.messages = []
+
+            def send(self, message):
+                self.messages.append(message)
+
+        class SubjectConsumer(EmailConsumer):
+            @classmethod
+            def from_app(cls, app):
+                return cls(Mailbox())
+
+            def create_message(self, event_json):
+                return "Subject: {0}".format(loads(event_json)["title"])
+
+        email_consumer = SubjectConsumer.from_app(self.app)
+        email_consumer(self.event_json)
+        email_consumer.consume_many([self.event_json] * 2)
+        assert email_consumer.mail.messages == \
+            ["Subject: {0}".format(self.event["title"])] * 3
+
+    def test_connection_reuse(self):
+        """Messages share connections, which are reopened when lost."""
+        class Connection(object):
+            lose = False
+
+            def __init__(self):
+                self.messages = []
+                self.closed = False
+
+            def send(self, message):
+                if Connection.lose:
+                    Connection.lose = False
+                    raise smtplib.SMTPServerDisconnected()
+                self.messages.append(message)
+
+        class CountingConsumer(FlaskMailConsumer):
+            def open_connection(self):
+                connections.append(Connection())
+                return connections[-1]
+
+            def close_connection(self, connection):
+                connection.closed = True
+
+        connections = []
+        email_consumer = CountingConsumer(
+            self.flaskmail.mail, self.default_email_account,
+            [self.default_email_account], max_messages=3
+        )
+        with self.app.test_request_context():
+            email_consumer.consume_many([self.event_json] * 4)
+            assert [len(c.messages) for c in connections] == [3, 1]
+            assert connections[0].closed and not connections[1].closed
+
+            Connection.lose = True
+            email_consumer(self.event_json)
+            assert [len(c.messages) for c in connections] == [3, 1, 1]
+            assert connections[1].closed
+
+            email_consumer.close()
+            assert connections[2].closed
 
 
 class PushNotificationTest(NotificationsFlaskTestCase):
@@ -166,6 +431,208 @@ class PushNotificationTest(NotificationsFlaskTestCase):
             message = next(propagated_messages)
             assert message['data'].decode("utf-8") == self.event_json
 
+    def test_push_fan_out(self):
+        """Every client of a hub receives every message."""
+        with self.app.test_request_context():
+            hub_id = EventHub("TestFanOut", self.celery).hub_id
+            push_function = PushConsumer(self.backend, hub_id)
+
+            sse_notifier = self.notifications.sse_notifier_for(hub_id)
+            clients = [iter(sse_notifier.client()) for _ in range(3)]
+
+            # The first frame sets the retry timeout of the client
+            for client in clients:
+                assert next(client).startswith(b"retry")
+
+            push_function.consume(self.event_json)
+            for client in clients:
+                frame = next(client).decode("utf-8")
+                assert "data: {0}".format(self.event_json) in frame
+
+            for client in clients:
+                client.close()
+            assert len(sse_notifier.clients) == 0
+
+    def test_push_replay(self):
+        """A client reconnecting gets the messages it missed."""
+        with self.app.test_request_context():
+            hub_id = EventHub("TestReplay", self.celery).hub_id
+            sse_notifier = self.notifications.sse_notifier_for(hub_id)
+
+            for body in ("first", "second", "third"):
+                sse_notifier.publish(body)
+            frames = list(sse_notifier.replay.since(
+                "{0}-0".format(sse_notifier.replay.token)))
+            assert len(frames) == 3
+
+            last_event_id = frames[0].decode("utf-8").split("\n")[0][4:]
+            client = iter(sse_notifier.client(last_event_id=last_event_id))
+            assert next(client).startswith(b"retry")
+            assert b"data: second" in next(client)
+            assert b"data: third" in next(client)
+            client.close()
+
+            # Unknown ids, from another process, cannot be replayed
+            assert sse_notifier.replay.since("unknown-1") is None
+
+    def test_push_replay_evicted(self):
+        """Clients which missed evicted messages are told to reload."""
+        replay = ReplayBuffer(max_events=3)
+        token = replay.token
+        for i in range(1, 11):
+            replay.next_id()
+            replay.append("f{0}".format(i))
+        assert replay.since("{0}-7".format(token)) == ["f8", "f9", "f10"]
+        assert replay.since("{0}-10".format(token)) == []
+        assert replay.since("{0}-1".format(token)) is None
+        assert replay.since("{0}-6".format(token)) is None
+
+        sse_notifier = SseNotifier(self.notifications.create_backend(),
+                                   "TestReplayEvicted", replay_events=3)
+        for body in range(10):
+            sse_notifier.publish(str(body))
+        reset, = sse_notifier.replayed(
+            "{0}-1".format(sse_notifier.replay.token))
+        assert reset.decode("utf-8").split("\n")[:3] == [
+            "id: {0}".format(sse_notifier.replay.last_id()),
+            "event: reset", "data: reload"]
+        reset, = sse_notifier.replayed("unknown-1")
+        assert b"event: reset" in reset
+
+    def test_shared_redis_subscription(self):
+        """The backends of a process share a single pubsub connection."""
+        backends = [self.notifications.create_backend() for _ in range(3)]
+        assert backends[0].broker is backends[1].broker
+
+        for i, backend in enumerate(backends):
+            backend.subscribe("TestShared{0}".format(i))
+            assert next(backend.listen())["type"] == "subscribe"
+
+        backends[0].publish("TestShared2", "message")
+        message = next(backends[2].listen())
+        assert message["type"] == "message"
+        assert message["data"] == b"message"
+        assert backends[0]._queue.empty() and backends[1]._queue.empty()
+
+        stats = backends[0].stats()
+        assert stats["channels"] == 3
+        assert stats["subscriptions"] == 3
+        assert stats["redis_channels"] == 3
+
+    def test_push_batches(self):
+        """Events are published in batches of a size or after a time."""
+        backend = self.notifications.create_backend()
+        backend.subscribe("TestBatches")
+        messages = backend.listen()
+        assert next(messages)["type"] == "subscribe"
+
+        push_function = PushConsumer(backend, "TestBatches", batch_size=3,
+                                     flush_interval=0.05)
+        assert push_function.consume("first") is None
+        assert push_function.consume("second") is None
+        assert push_function.consume("third") == [1, 1, 1]
+        assert [next(messages)["data"] for _ in range(3)] == \
+            [b"first", b"second", b"third"]
+
+        # A lonely event waits at most the flush interval
+        assert push_function.consume("fourth") is None
+        assert next(messages)["data"] == b"fourth"
+
+        assert push_function.consume_many(["fifth", "sixth"]) == [1, 1]
+        assert [next(messages)["data"] for _ in range(2)] == \
+            [b"fifth", b"sixth"]
+
+        # The waiting events are published when the consumer is closed,
+        # which happens when the process exits
+        push_function.flush_interval = 60
+        assert push_function.consume("seventh") is None
+        push_function.close()
+        assert next(messages)["data"] == b"seventh"
+
+    def test_push_hooks(self):
+        """The hooks run for every event, sent alone or in a chunk."""
+        hooks = []
+
+        class HookedPushConsumer(PushConsumer):
+            def before_consume(self, event_json, *args, **kwargs):
+                hooks.append("before")
+
+            def after_consume(self, event_json, *args, **kwargs):
+                hooks.append("after")
+
+        hub = self.notifications.create_hub("Hooks")
+        hub.register_consumer(
+            HookedPushConsumer(self.notifications.create_backend(),
+                               hub.hub_id),
+            executor=INLINE
+        )
+        self.notifications.send(self.event)
+        assert hooks == ["before", "after"]
+        self.notifications.send_many([self.event] * 2)
+        assert hooks == ["before", "after"] + ["before"] * 2 + ["after"] * 2
+
+    def test_redis_streams_backend(self):
+        """A restarted streams backend resumes from its offset."""
+        def create_backend():
+            return RedisStreamsBackend(self.redis, group="TestGroup",
+                                       consumer="gateway", block=10)
+
+        channel = "TestStreams-{0}".format(uuid.uuid4().hex)
+        backend = create_backend()
+        backend.subscribe(channel)
+        backend.publish_many((channel, body) for body in ("a", "b", "c"))
+
+        messages = backend.listen()
+        assert next(messages)["type"] == "subscribe"
+        assert next(messages)["data"] == b"a"
+        assert next(messages)["data"] == b"b"
+
+        # The second event was being handled when the backend stopped
+        backend = create_backend()
+        backend.subscribe(channel)
+        messages = backend.listen()
+        assert next(messages)["type"] == "subscribe"
+        assert next(messages)["data"] == b"b"
+        message = next(messages)
+        assert message["data"] == b"c"
+        assert backend.offsets() == {channel: message["id"]}
+
+        # The events pending for another consumer which never comes back
+        # are claimed by the next backend subscribing
+        backend.publish(channel, "d")
+        assert next(messages)["data"] == b"d"
+        time.sleep(0.02)
+        backend = RedisStreamsBackend(self.redis, group="TestGroup",
+                                      consumer="other", block=10,
+                                      claim_idle=10)
+        backend.subscribe(channel)
+        messages = backend.listen()
+        assert next(messages)["type"] == "subscribe"
+        assert next(messages)["data"] == b"d"
+
+    def test_push_local_backend(self):
+        """Events are pushed within the process by the LocalBackend."""
+        app = Flask(__name__)
+        app.config.update(self.config)
+        app.config["BACKEND"] = \
+            "flask_notifications.backend.local_backend.LocalBackend"
+        notifications = Notifications(app=app, celery=self.celery,
+                                      broker=LocalBroker())
+
+        with app.test_request_context():
+            hub_id = EventHub("TestLocalPush", self.celery).hub_id
+            push_function = PushConsumer(notifications.create_backend(),
+                                         hub_id)
+
+            sse_notifier = notifications.sse_notifier_for(hub_id)
+            client = iter(sse_notifier.client())
+            assert next(client).startswith(b"retry")
+
+            assert push_function.consume(self.event_json) == 1
+            frame = next(client).decode("utf-8")
+            assert "data: {0}".format(self.event_json) in frame
+            client.close()
+
 
 class LogNotificationTest(NotificationsFlaskTestCase):
 
@@ -179,13 +646,141 @@ class LogNotificationTest(NotificationsFlaskTestCase):
                 os.remove(filepath)
             log_function = LogConsumer(filepath)
             log_function.consume(self.event_json)
+            log_function.close()
 
             # Check and remove file
             with open(filepath, "r") as f:
                 written_line = f.readline()
-                assert written_line == self.event_json
+                assert written_line.rstrip("\n") == self.event_json
             os.remove(filepath)
 
+    def test_log_group_commit(self):
+        """Events are written in groups and rotated by size."""
+        directory = tempfile.mkdtemp()
+        filepath = os.path.join(directory, "events.log")
+        try:
+            log_function = LogConsumer(filepath, commit_events=3,
+                                       commit_interval=60, fsync=FSYNC_COMMIT,
+                                       max_bytes=len(self.event_json) * 5)
+            # Every process rotates its own file
+            assert log_function.path() == "{0}.{1}".format(filepath,
+                                                           os.getpid())
+            filepath = log_function.path()
+
+            log_function.consume(self.event_json)
+            log_function.consume(self.event_json)
+            assert not os.path.exists(filepath)
+            log_function.consume(self.event_json)
+            assert list(read_events(filepath)) == [self.event_json] * 3
+
+            # The fifth event makes the file big enough to rotate it
+            log_function.consume_many([self.event_json] * 2)
+            assert not os.path.exists(filepath)
+            rotated, = os.listdir(directory)
+            events = list(read_events(os.path.join(directory, rotated),
+                                      event_cls=Event))
+            assert len(events) == 5
+            assert events[0]["event_id"] == self.event["event_id"]
+
+            log_function.consume(self.event_json)
+            log_function.close()
+            assert list(read_events(filepath)) == [self.event_json]
+
+            # A partially written event is ignored
+            with open(filepath, "a") as f:
+                f.write(self.event_json[:10])
+            assert list(read_events(filepath)) == [self.event_json]
+
+            # The groups which the timer fails to write are logged
+            log_function = LogConsumer(os.path.join(directory, "missing",
+                                                    "events.log"),
+                                       commit_events=3, commit_interval=0.01)
+            records = []
+            handler = logging.Handler()
+            handler.emit = records.append
+            logger = logging.getLogger(
+                "flask_notifications.consumers.log.log_consumer"
+            )
+            logger.addHandler(handler)
+            try:
+                log_function.consume(self.event_json)
+                deadline = time.time() + 5
+                while not records and time.time() < deadline:
+                    time.sleep(0.01)
+            finally:
+                logger.removeHandler(handler)
+            assert "events.log failed" in records[0].getMessage()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_archive(self):
+        """Archived events are found by time range and id."""
+        directory = tempfile.mkdtemp()
+        try:
+            # Timestamps are not ordered
+            timestamps = [1000, 1002, 1001, 1004, 1003, 1006, 1005, 1007]
+            events = [Event("archived{0}".format(i), "user", "Archived",
+                            "Body", timestamp=timestamp)
+                      for i, timestamp in enumerate(timestamps)]
+
+            # Segments of four events, in blocks of two events
+            size = len(events[0].to_json()) + 1
+            archive = ArchiveConsumer(directory, commit_events=4,
+                                      segment_bytes=size * 3,
+                                      index_interval=size * 2)
+            for event in events:
+                archive.consume(event.to_json())
+            archive.close()
+
+            # Each process writes its own segments
+            reader = ArchiveReader(directory)
+            segments = reader.segments()
+            assert segments == ["{0:010d}-{1}".format(number, os.getpid())
+                                for number in (1, 2)]
+            assert len(reader.blocks(segments[0])) > 1
+
+            found = reader.events(1002, 1005)
+            assert sorted(event["timestamp"] for event in found) == \
+                [1002, 1003, 1004]
+            assert len(list(reader.events())) == len(events)
+            assert reader.get("archived6")["timestamp"] == 1005
+            assert reader.get("unknown") is None
+            assert len(reader._ids) == 2
+
+            # Only the id indexes of the last used segments are kept
+            reader = ArchiveReader(directory, max_segments=1)
+            assert reader.get("archived0")["timestamp"] == 1000
+            assert reader.get("archived6")["timestamp"] == 1005
+            assert segments[0] not in reader._ids
+            assert segments[1] in reader._ids
+
+            # Events written after the last block are read as well
+            archive = ArchiveConsumer(directory, commit_events=1)
+            archive.consume(self.event_json)
+            assert len(reader.segments()) == 3
+            assert reader.blocks(reader.segments()[-1]) == []
+            assert reader.get(self.event["event_id"])["title"] == \
+                self.event["title"]
+
+            # The id index of a segment is extended as it grows
+            archive.archive([Event("archived-later", "user", "Archived",
+                                   "Body")])
+            assert reader.get("archived-later")["title"] == "Archived"
+            archive.close()
+
+            # Binary codecs are archived as text and read back
+            class MsgpackEvent(Event):
+                codec = MsgpackCodec()
+
+            archive = ArchiveConsumer(directory, event_cls=MsgpackEvent)
+            archive.consume(MsgpackEvent("packed", "user", "Packed",
+                                         "Body").to_json())
+            archive.close()
+            reader = ArchiveReader(directory, event_cls=MsgpackEvent)
+            assert reader.get("packed")["title"] == "Packed"
+        finally:
+            shutil.rmtree(directory)
+
 
 class EventHubAndFiltersTest(NotificationsFlaskTestCase):
 
@@ -291,6 +886,484 @@ class EventHubAndFiltersTest(NotificationsFlaskTestCase):
         self.event["timestamp"] = self.next_to_tomorrow_tm
         assert f1f2(self.event) is False
 
+    def test_compiled_filters(self):
+        """Compiled filters must agree with the filter tree."""
+        composed = ((WithEventType("user") & WithSender("system")) |
+                    (Not(Expired()) ^ WithId("1234")) &
+                    WithRecipients(["jvican"]) &
+                    AfterDate(self.tomorrow))
+        compiled = composed.compile()
+
+        assert compiled(self.event) == composed(self.event)
+        self.event["sender"] = "antisystem"
+        assert compiled(self.event) == composed(self.event)
+        self.event["event_id"] = "123"
+        assert compiled(self.event) == composed(self.event)
+        self.event["expiration_datetime"] = datetime.now()
+        assert compiled(self.event) == composed(self.event)
+
+    def test_compiled_subclass_filters(self):
+        """Subclasses changing the logic of a filter are not inlined."""
+        class WithEventTypePrefix(WithEventType):
+            def filter(self, event, *args, **kwargs):
+                return event["event_type"].startswith(self.target_event_type)
+
+        class NeitherFilter(AndFilter):
+            def filter(self, event, *args, **kwargs):
+                return not (self.one(event) or self.other(event))
+
+        prefix = WithEventTypePrefix("us")
+        assert prefix(self.event) is True
+        assert prefix.compile()(self.event) is True
+        assert (prefix & WithSender("system")).compile()(self.event) is True
+
+        neither = NeitherFilter(WithId("0"), WithSender("nobody"))
+        assert neither.compile()(self.event) is True
+
+    def test_compile_long_chains(self):
+        """Long chains of filters compile, or fall back to the tree."""
+        chain = WithId("0")
+        for i in range(1, 300):
+            chain = chain | WithId(str(i))
+        chain = chain | WithId(self.event["event_id"])
+        compiled = chain.compile()
+        assert "(((" not in compiled.source
+        assert compiled(self.event) is True
+
+        # Alternating operators cannot be flattened
+        nested = WithId("0")
+        for i in range(1, 300):
+            nested = (nested & WithId(str(i))) if i % 2 else \
+                (nested | WithId(str(i)))
+        nested = nested | WithId(self.event["event_id"])
+        self.event_hub.filter_by(nested)
+        assert self.event_hub.matches(self.event) is True
+        assert self.event_hub._hub_predicate.source is None
+
+    def test_hub_uses_compiled_filter(self):
+        """Hubs must compile the filter they are given."""
+        self.event_hub.filter_by(WithEventType("user") & WithSender("system"))
+        assert self.event_hub._hub_predicate(self.event) is True
+        self.event["sender"] = "antisystem"
+        assert self.event_hub._hub_predicate(self.event) is False
+
+
+class HubIndexTest(NotificationsFlaskTestCase):
+
+    def test_candidate_hubs(self):
+        """Only hubs which may match an event are candidates for it."""
+        user_hub = self.notifications.create_hub("IndexUser")
+        user_hub.filter_by(WithEventType("user") & Not(Expired()))
+        system_hub = self.notifications.create_hub("IndexSystem")
+        system_hub.filter_by(WithEventType("system"))
+        tenant_hub = self.notifications.create_hub("IndexTenant")
+        tenant_hub.filter_by(WithSender("john") | WithRecipients(["jvican"]))
+        negated_hub = self.notifications.create_hub("IndexNegated")
+        negated_hub.filter_by(Not(WithEventType("system")))
+
+        candidates = self.notifications._hub_index.candidates(self.event)
+        assert user_hub in candidates
+        assert system_hub not in candidates
+        assert tenant_hub in candidates
+        assert negated_hub in candidates
+
+        # Changing the filter of a hub updates the index
+        system_hub.filter_by(WithSender("system"))
+        candidates = self.notifications._hub_index.candidates(self.event)
+        assert system_hub in candidates
+
+        # Subclasses changing the logic of a filter are not indexed
+        class WithSenderPrefix(WithSender):
+            def filter(self, event, *args, **kwargs):
+                return event["sender"].startswith(self.target_sender)
+
+        prefix_hub = self.notifications.create_hub("IndexPrefix")
+        prefix_hub.filter_by(WithSenderPrefix("sys"))
+        candidates = self.notifications._hub_index.candidates(self.event)
+        assert prefix_hub in candidates
+
+        # Replacing a hub removes the previous one from the index
+        new_system_hub = self.notifications.create_hub("IndexSystem")
+        candidates = self.notifications._hub_index.candidates(self.event)
+        assert system_hub not in candidates
+        assert new_system_hub in candidates
+
+
+class SendManyTest(NotificationsFlaskTestCase):
+
+    def test_send_many_in_chunks(self):
+        """Matching events reach the consumers in chunks."""
+        chunks = []
+
+        class ChunkConsumer(LogConsumer):
+            def consume_many(self, events_json, *args, **kwargs):
+                chunks.append(events_json)
+
+        hub = self.notifications.create_hub("SendMany")
+        hub.filter_by(WithEventType("user"))
+        hub.register_consumer(ChunkConsumer(), name="tests.chunk_consumer")
+
+        events = (Event(None, event_type="user" if i % 2 else "system",
+                        title="Event {0}".format(i), body="")
+                  for i in range(20))
+        with self.app.test_request_context():
+            self.notifications.send_many(events, chunk_size=4)
+
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        titles = [Event.from_json(event_json)["title"]
+                  for chunk in chunks for event_json in chunk]
+        assert titles == ["Event {0}".format(i) for i in range(1, 20, 2)]
+
+    def test_serialized_once(self):
+        """Events are serialized once for all the hubs and consumers."""
+        encoded = []
+
+        class CountingCodec(JSONCodec):
+            def encode(self, event):
+                encoded.append(event["event_id"])
+                return super(CountingCodec, self).encode(event)
+
+        class CountingEvent(Event):
+            codec = CountingCodec()
+
+        for alias in ("OnceA", "OnceB"):
+            hub = self.notifications.create_hub(alias)
+            hub.filter_by(WithEventType("user"))
+            for name in ("first", "second"):
+                def consumer(event_json):
+                    pass
+                hub.register_consumer(
+                    consumer, name="tests.{0}.{1}".format(alias, name)
+                )
+
+        event = CountingEvent(**self.event.data)
+        self.notifications.send(event)
+        assert encoded == [event["event_id"]]
+
+        del encoded[:]
+        self.notifications.send_many([event])
+        assert encoded == [event["event_id"]]
+
+
+class ExecutorTest(NotificationsFlaskTestCase):
+
+    def test_inline_and_thread_pool(self):
+        """Consumers run in the sending process without Celery."""
+        consumed = []
+
+        hub = self.notifications.create_hub("Executors")
+
+        def inline_consumer(event_json):
+            consumed.append(("inline", event_json))
+
+        def failing_consumer(event_json):
+            raise RuntimeError("The other consumers still get the event")
+
+        def pooled_consumer(event_json):
+            consumed.append(("thread-pool", event_json))
+
+        hub.register_consumer(failing_consumer, executor=INLINE)
+        hub.register_consumer(inline_consumer, executor=INLINE)
+        hub.register_consumer(pooled_consumer, executor=THREAD_POOL)
+        assert hub.registered_consumers[inline_consumer] == INLINE
+
+        self.notifications.send(self.event)
+        self.notifications.send_many([self.event])
+        hub.shutdown()
+        assert sorted(consumed) == [("inline", self.event_json)] * 2 + \
+            [("thread-pool", self.event_json)] * 2
+
+        # Expired events are dropped when the consumer runs
+        del consumed[:]
+        self.event["expiration_datetime"] = datetime.now() - \
+            timedelta(days=1)
+        self.notifications.send(self.event)
+        hub.shutdown()
+        assert consumed == []
+        assert self.notifications.dropped["send"] == 1
+
+    def test_aware_expiration(self):
+        """Timezone-aware expirations are compared with the current time."""
+        consumed = []
+
+        hub = self.notifications.create_hub("AwareExpiration")
+
+        def pooled_consumer(event_json):
+            consumed.append(loads(event_json)["event_id"])
+
+        def deferred_consumer(event_json):
+            consumed.append("deferred")
+
+        hub.register_consumer(pooled_consumer, executor=THREAD_POOL)
+        hub.register_consumer(
+            deferred_consumer, executor=INLINE,
+            rate_limit=self.notifications.rate_limit(1, key=CONSUMER)
+        )
+
+        now = datetime.now(UTC())
+        events = [Event(event_id, "user", "Title", "Body",
+                        expiration_datetime=expiration)
+                  for event_id, expiration in (
+                      ("aware", now + timedelta(days=1)),
+                      ("naive", datetime.now() + timedelta(days=1)),
+                      ("expired", now - timedelta(seconds=1)),
+                      ("short", now + timedelta(seconds=0.5)))]
+        self.notifications.send(events[0])
+        self.notifications.send_many(events[1:])
+        hub.shutdown()
+
+        # The short event would expire before getting a token
+        assert sorted(consumed) == ["aware", "deferred", "naive", "short"]
+        assert self.notifications.dropped["send"] == 1
+        assert self.notifications.dropped["rate-limit"] == 1
+
+    def test_process_pool(self):
+        """Built-in consumers run in a process pool."""
+        directory = tempfile.mkdtemp()
+        filepath = os.path.join(directory, "events.log")
+        try:
+            hub = self.notifications.create_hub("ProcessPool")
+            hub.register_consumer(LogConsumer(filepath, commit_events=1),
+                                  executor=PROCESS_POOL)
+            self.notifications.send(self.event)
+
+            # Each worker process installs the consumers once, and the
+            # running pool is replaced to get the new one
+            tokens = os.path.join(directory, "tokens.log")
+            hub.register_consumer(TokenLogConsumer(tokens, commit_events=1),
+                                  executor=PROCESS_POOL)
+            for _ in range(20):
+                self.notifications.send(self.event)
+            self.notifications.send_many([self.event] * 5)
+            hub.shutdown()
+            assert len(list(read_events(filepath))) == 26
+            tokens = list(read_events(tokens))
+            assert len(tokens) == 25
+            assert len(set(tokens)) <= hub.max_workers
+
+            self.assertRaises(ValueError, hub.register_consumer,
+                              lambda event_json: None,
+                              executor=PROCESS_POOL)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_earliest_deadline_first(self):
+        """Pools run the earliest deadlines first and drop expired ones."""
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        executor = create_executor(THREAD_POOL, max_workers=1)
+        executor.submit(None, block)
+        started.wait()
+
+        now = datetime.now()
+        executor.submit(None, order.append, "without deadline")
+        executor.submit(now + timedelta(hours=2), order.append, "later")
+        executor.submit(now + timedelta(hours=1), order.append, "sooner")
+        expiring = executor.submit(now + timedelta(milliseconds=50),
+                                   order.append, "expired")
+        time.sleep(0.1)
+        release.set()
+        executor.shutdown()
+
+        assert order == ["sooner", "later", "without deadline"]
+        assert expiring.cancelled()
+        assert executor.dropped[THREAD_POOL] == 1
+
+    def test_priority_lanes(self):
+        """Events get the lane of their priority, type or hub."""
+        lanes = PriorityLanes(event_types={"alert": HIGH},
+                              queues={HIGH: "notifications.high"},
+                              levels={HIGH: 0, LOW: 9})
+        hub = EventHub("Lanes", self.celery, priority=LOW, lanes=lanes)
+
+        alert = Event(None, "alert", "Title", "Body")
+        digest = Event(None, "digest", "Title", "Body")
+        urgent = Event(None, "digest", "Title", "Body", priority=HIGH)
+        assert hub.lane(alert) == HIGH
+        assert hub.lane(digest) == LOW
+        assert hub.lane(urgent) == HIGH
+        assert hub.most_urgent_lane([digest, alert]) == HIGH
+        assert EventHub("Normal", self.celery).lane(digest) == NORMAL
+
+        assert lanes.task_options(HIGH) == {"queue": "notifications.high",
+                                            "priority": 0}
+        assert lanes.task_options(LOW) == {"priority": 9}
+        assert lanes.task_options(NORMAL) == {}
+
+        # The urgent lanes get most of the pool without starving the others
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        executor = create_executor(THREAD_POOL, max_workers=1,
+                                   weights=lanes.weights)
+        executor.submit(None, block)
+        started.wait()
+        for lane in (LOW, LOW, HIGH, HIGH, HIGH, HIGH, HIGH, HIGH, HIGH):
+            executor.submit(None, order.append, lane, lane=lane)
+        release.set()
+        executor.shutdown()
+
+        assert order == [HIGH] * 3 + [LOW] + [HIGH] * 4 + [LOW]
+
+
+class RateLimitTest(NotificationsFlaskTestCase):
+
+    def test_token_buckets(self):
+        """Buckets defer the events over the limit, or refuse them."""
+        self.redis.delete("test:a", "test:b")
+        for buckets in (LocalTokenBuckets(),
+                        RedisTokenBuckets(self.redis, prefix="test:")):
+            assert buckets.acquire(["a"], 1, 2, now=100) == 0
+            assert buckets.acquire(["a", "b"], 1, 2, now=100) == 0
+            assert buckets.acquire(["a"], 1, 2, max_delay=0, now=100) is None
+            assert buckets.acquire(["a"], 1, 2, now=100) == 1
+            assert buckets.acquire(["b"], 1, 2, now=102) == 0
+            assert buckets.acquire(["a"], 1, 2, now=101.5) == 0.5
+
+    def test_rate_limited_consumers(self):
+        """Over-limit events are dropped or deferred, per recipient."""
+        consumed = []
+
+        hub = self.notifications.create_hub("RateLimits")
+
+        def limited_consumer(event_json):
+            consumed.append(("limited", loads(event_json)["event_id"]))
+
+        def deferred_consumer(event_json):
+            consumed.append(("deferred", loads(event_json)["event_id"]))
+
+        hub.register_consumer(
+            limited_consumer, executor=INLINE,
+            rate_limit=self.notifications.rate_limit(1, policy=DROP)
+        )
+        hub.register_consumer(
+            deferred_consumer, executor=INLINE,
+            rate_limit=self.notifications.rate_limit(20, capacity=1,
+                                                     key=CONSUMER)
+        )
+
+        events = [Event(str(i), "user", "Title", "Body",
+                        recipients=["ana", "bob"][:i + 1]) for i in range(3)]
+        self.notifications.send_many(events)
+        assert sorted(consumed) == [("deferred", "0"), ("limited", "0")]
+        assert self.notifications.dropped["rate-limit"] == 2
+
+        time.sleep(0.2)
+        assert sorted(consumed) == [("deferred", "0"), ("deferred", "1"),
+                                    ("deferred", "2"), ("limited", "0")]
+
+
+class DeduplicationTest(NotificationsFlaskTestCase):
+
+    def test_duplicates_dropped(self):
+        """Events sent again within the window are dropped once."""
+        consumed = []
+
+        hub = self.notifications.create_hub("Deduplication")
+
+        def consumer(event_json):
+            consumed.append(loads(event_json)["event_id"])
+
+        hub.register_consumer(consumer, executor=INLINE)
+        self.redis.delete(*["flask-notifications:seen:{0}".format(event_id)
+                            for event_id in ("first", "second", "retried",
+                                             "retried-many")])
+        self.notifications.deduplicator = Deduplicator(60, redis=self.redis)
+
+        first = Event("first", "user", "Title", "Body")
+        second = Event("second", "user", "Title", "Body")
+        self.notifications.send(first)
+        self.notifications.send(first)
+        self.notifications.send_many([first, second, second])
+        assert consumed == ["first", "second"]
+        assert self.notifications.dropped["duplicate"] == 3
+
+        # Other workers share the ids seen through Redis
+        other_worker = Deduplicator(60, redis=self.redis)
+        third = Event("third", "user", "Title", "Body")
+        assert other_worker.first_seen([first, third]) == [False, True]
+
+        # Events which fail to be sent are not duplicates when retried
+        del consumed[:]
+        consume, dispatch_many = hub.consume, hub.dispatch_many
+
+        def broker_down(*args):
+            raise RuntimeError("The broker is down")
+
+        hub.consume = hub.dispatch_many = broker_down
+        retried = Event("retried", "user", "Title", "Body")
+        retried_many = Event("retried-many", "user", "Title", "Body")
+        self.assertRaises(RuntimeError, self.notifications.send, retried)
+        self.assertRaises(RuntimeError, self.notifications.send_many,
+                          [retried_many])
+        hub.consume, hub.dispatch_many = consume, dispatch_many
+        self.notifications.send(retried)
+        self.notifications.send_many([retried_many])
+        assert consumed == ["retried", "retried-many"]
+        assert self.notifications.dropped["duplicate"] == 3
+
+        # The ids seen by a process are bounded and expire
+        seen = LocalSeenIds(10, max_size=2)
+        assert [seen.add(event_id, now=100) for event_id in "abca"] == \
+            [True, True, True, True]
+        assert seen.add("a", now=105) is False
+        assert seen.add("a", now=111) is True
+
+
+class HubDispatchTest(NotificationsFlaskTestCase):
+
+    def test_one_task_per_event(self):
+        """A single task runs all the consumers of the hub."""
+        consumed = []
+
+        hub = self.notifications.create_hub("HubDispatch", dispatch="hub")
+
+        def first(event_json):
+            consumed.append(("first", event_json))
+
+        def failing(event_json):
+            raise RuntimeError("The other consumers still get the event")
+
+        def last(event_json):
+            consumed.append(("last", event_json))
+
+        for consumer in (first, failing, last):
+            name = "tests.hub.{0}".format(consumer.__name__)
+            hub.register_consumer(consumer, name=name)
+
+        # The consumers run in the task of the hub, without options
+        self.assertRaises(ValueError, hub.register_consumer,
+                          lambda event_json: None, max_retries=3)
+
+        # The hub is the only receiver of its signal
+        results = hub.signal.send(self.event)
+        assert len(results) == 1
+        timings = results[0][1].result
+        assert timings["tests.hub.failing"] is None
+        assert timings["tests.hub.first"] >= 0
+        assert consumed == [("first", self.event_json),
+                            ("last", self.event_json)]
+
+        del consumed[:]
+        self.notifications.send_many([self.event])
+        assert consumed == [("first", self.event_json),
+                            ("last", self.event_json)]
+
+        for consumer in (first, failing, last):
+            hub.deregister_consumer(consumer)
+        assert not hub.signal.receivers
+
 
 if __name__ == '__main__':
     unittest.main()